@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: building keyboards on every FSM step vs. the prebuilt registry.
+
+Run from the repository root (texts.py reads messages.json from the cwd):
+
+    python benchmarks/bench_keyboards.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyboards import reply  # noqa: E402
+from keyboards.registry import registry  # noqa: E402
+from utils import request_renderer  # noqa: E402
+
+ROUNDS = 2000
+
+KEYBOARDS = [
+    reply.get_start_kb,
+    reply.get_role_selection_kb,
+    reply.get_client_property_kb,
+    reply.get_client_stage_kb,
+    reply.get_partner_role_kb,
+    reply.get_partner_budget_kb,
+    reply.get_done_kb,
+]
+
+
+def allocated_per_call(func, rounds: int = 200) -> float:
+    """Bytes allocated per call (tracemalloc, summed over all allocations)."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [func() for _ in range(rounds)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del results
+    stats = after.compare_to(before, "filename")
+    return sum(s.size_diff for s in stats if s.size_diff > 0) / rounds
+
+
+def bench(name, fresh, cached):
+    fresh_us = timeit.timeit(fresh, number=ROUNDS) / ROUNDS * 1e6
+    cached_us = timeit.timeit(cached, number=ROUNDS) / ROUNDS * 1e6
+    fresh_bytes = allocated_per_call(fresh)
+    cached_bytes = allocated_per_call(cached)
+    print(
+        f"{name:<28} build {fresh_us:8.1f} us {fresh_bytes:8.0f} B | "
+        f"registry {cached_us:6.2f} us {cached_bytes:6.0f} B"
+    )
+    return fresh_us, cached_us
+
+
+def main():
+    registry.build_all()
+    print("Per call: time and bytes allocated (still referenced after the call)")
+    total_fresh = total_cached = 0.0
+    for getter in KEYBOARDS:
+        fresh_us, cached_us = bench(getter.__name__, getter.build, getter)
+        total_fresh += fresh_us
+        total_cached += cached_us
+
+    page = {
+        "requests": [
+            {"id": str(i), "type": "Заказчик", "status": "Новая",
+             "date": "2025-12-17 10:00:00", "amount": "150000"}
+            for i in range(20, 15, -1)
+        ],
+        "prev": None, "next": "16", "total": 20,
+    }
+    ids = tuple(req["id"] for req in page["requests"])
+    bench(
+        "requests page keyboard",
+        lambda: request_renderer._page_keyboard.__wrapped__(ids, None, "req_page:n:16:"),
+        lambda: request_renderer._page_keyboard(ids, None, "req_page:n:16:"),
+    )
+
+    print(f"\nStatic keyboards, one of each: {total_fresh:.1f} us built vs {total_cached:.2f} us from the registry")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Offline benchmark of utils/google_sheets.py and the poller, backed by the
+in-memory fake worksheet (benchmarks/fake_gspread.py): no credentials needed.
+
+Run from the repository root (texts.py reads messages.json from the cwd):
+
+    python benchmarks/bench_sheets.py
+    python benchmarks/bench_sheets.py --sizes 1000 10000 --latency-ms 150 --failure-rate 0.01
+
+Every sheet size runs in a fresh subprocess with its own DATA_DIR, so the
+local mirror, caches and ID sequence start cold. Latency percentiles (ms)
+and the fake's API call counts per operation go to a JSON file
+(benchmarks/results/bench_sheets.json by default) for comparing runs.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_OUT = os.path.join(ROOT, "benchmarks", "results", "bench_sheets.json")
+# Requests per Telegram user in the generated sheet, on average
+REQUESTS_PER_USER = 5
+FIRST_TG_ID = 100000
+
+
+def percentiles(samples: list) -> dict:
+    """Nearest-rank percentiles of durations in seconds, reported in ms."""
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+    return {
+        "p50_ms": round(rank(50), 3),
+        "p95_ms": round(rank(95), 3),
+        "p99_ms": round(rank(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def make_rows(size: int, seed: int) -> list:
+    """Header plus `size` requests in the HEADERS schema, clients before partners."""
+    from utils import google_sheets as gs
+
+    rnd = random.Random(seed)
+    users = max(1, size // REQUESTS_PER_USER)
+    started = datetime.datetime(2024, 1, 1)
+    rows = []
+    for i in range(1, size + 1):
+        tg_id = FIRST_TG_ID + rnd.randrange(users)
+        row = [""] * len(gs.HEADERS)
+        row[gs.COL_ID] = str(i)
+        row[gs.COL_DATE] = (started + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+        row[gs.COL_USER_TYPE] = "Заказчик" if rnd.random() < 0.7 else "Партнер"
+        row[gs.COL_PARTNER_ROLE] = "-"
+        row[gs.COL_NAME] = f"User {tg_id}"
+        row[gs.COL_PHONE] = f"+7 900 {tg_id:07d}"
+        row[gs.COL_CITY] = "Москва"
+        row[gs.COL_STATUS] = rnd.choice(gs.STATUS_VALUES)
+        row[gs.COL_AMOUNT] = str(rnd.randrange(10, 500) * 1000)
+        row[gs.COL_TG_ID] = str(tg_id)
+        rows.append(row)
+    rows.sort(key=lambda r: r[gs.COL_USER_TYPE])
+    return [list(gs.HEADERS)] + rows
+
+
+async def measure(ws, iterations: int, operation) -> dict:
+    """Run operation(i) `iterations` times; latencies plus the API calls it made."""
+    ws.reset_counters()
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await operation(i)
+        samples.append(time.perf_counter() - started)
+    calls = dict(sorted(ws.calls.items()))
+    return {
+        "iterations": iterations,
+        **percentiles(samples),
+        "api_calls": calls,
+        "api_calls_per_op": round(sum(calls.values()) / iterations, 3),
+        "api_failures": ws.failures,
+    }
+
+
+async def run_size(size: int, args) -> dict:
+    from benchmarks.fake_gspread import FakeWorksheet
+    from utils import google_sheets as gs, poller
+    from utils.change_detector import AlwaysChanged
+
+    rnd = random.Random(args.seed)
+    ws = FakeWorksheet(
+        make_rows(size, args.seed),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    # Skip authorization: the shared client manager hands out the fake
+    gs.sheet_manager._sheet = ws
+    users = max(1, size // REQUESTS_PER_USER)
+    detector = AlwaysChanged()
+    n = args.iterations
+    results = {}
+
+    async def load_index(_):
+        gs.request_index.invalidate()
+        await gs.ensure_index(await gs.get_async_service())
+
+    async def by_id(_):
+        await gs.get_request_by_id(str(rnd.randint(1, size)))
+
+    async def by_user(_):
+        gs.user_requests_cache.clear()
+        await gs.get_requests_by_user(str(FIRST_TG_ID + rnd.randrange(users)))
+
+    async def by_user_cached(_):
+        await gs.get_requests_by_user(str(FIRST_TG_ID))
+
+    async def update_status(_):
+        await gs.update_request_status(str(rnd.randint(1, size)), rnd.choice(gs.STATUS_VALUES))
+
+    async def append(i):
+        await gs.append_request("Client", {
+            "name": f"Bench {i}", "phone": "+7 900 000 00 00", "city": "Москва",
+            "property_type": "Квартира", "area": "50", "stage": "Черновая",
+            "description": "Benchmark request",
+        }, FIRST_TG_ID + i)
+
+    async def drain(_):
+        await gs.request_journal.replay()
+        await gs.write_queue.flush()
+
+    async def poll(_):
+        # Admins edit a few statuses between polls
+        with ws._lock:
+            for _ in range(args.edits_per_poll):
+                row = ws.rows[rnd.randint(1, len(ws.rows) - 1)]
+                row[gs.COL_STATUS] = rnd.choice(gs.STATUS_VALUES)
+        await poller.poll_once(detector)
+
+    results["load_index"] = await measure(ws, 1, load_index)
+    results["poll_cycle_initial"] = await measure(ws, 1, lambda _: poller.poll_once(detector))
+    results["get_request_by_id"] = await measure(ws, n, by_id)
+    results["get_requests_by_user"] = await measure(ws, n, by_user)
+    results["get_requests_by_user_cached"] = await measure(ws, n, by_user_cached)
+    results["update_request_status"] = await measure(ws, n, update_status)
+    results["append_request"] = await measure(ws, n, append)
+    results["append_drain"] = await measure(ws, 1, drain)
+    results["poll_cycle"] = await measure(ws, args.poll_cycles, poll)
+    return results
+
+
+def child(size: int, args):
+    """Benchmark one sheet size in this (fresh) process and write the results."""
+    with tempfile.TemporaryDirectory(prefix="bench_sheets_") as data_dir:
+        os.environ["DATA_DIR"] = data_dir
+        os.environ.setdefault("BOT_TOKEN", "0:bench")
+        os.environ.setdefault("ADMIN_IDS", "0")
+        # The benchmark measures the code, not the production quota
+        os.environ["SHEETS_QUOTA_PER_MINUTE"] = "1000000"
+        logging.basicConfig(level=logging.ERROR)
+        started = time.perf_counter()
+        results = asyncio.run(run_size(size, args))
+    with open(args.child_out, "w", encoding="utf-8") as f:
+        json.dump({"rows": size, "wall_s": round(time.perf_counter() - started, 2),
+                   "operations": results}, f)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(report: dict):
+    print(f"{'operation':<30}{'rows':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/op':>10}")
+    for run in report["runs"]:
+        for name, op in run["operations"].items():
+            print(
+                f"{name:<30}{run['rows']:>8}{op['p50_ms']:>10.2f}{op['p95_ms']:>10.2f}"
+                f"{op['p99_ms']:>10.2f}{op['api_calls_per_op']:>10.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--poll-cycles", type=int, default=5)
+    parser.add_argument("--edits-per-poll", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every fake API call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of API calls failing with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child, args)
+        return
+
+    runs = []
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            child_out = tmp.name
+        try:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                 "--child", str(size), "--child-out", child_out],
+                check=True,
+            )
+            with open(child_out, encoding="utf-8") as f:
+                runs.append(json.load(f))
+        finally:
+            os.remove(child_out)
+        print(f"{size} rows done in {runs[-1]['wall_s']}s", file=sys.stderr)
+
+    report = {
+        "benchmark": "bench_sheets",
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "iterations": args.iterations, "poll_cycles": args.poll_cycles,
+            "edits_per_poll": args.edits_per_poll, "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms, "failure_rate": args.failure_rate, "seed": args.seed,
+        },
+        "runs": runs,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_summary(report)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
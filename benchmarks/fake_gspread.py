@@ -0,0 +1,176 @@
+"""
+In-memory stand-in for a gspread Worksheet, for benchmarks and offline runs.
+
+Implements the calls the bot makes (row_values, get_all_values, batch_get,
+append_rows, batch_update, update, freeze, spreadsheet.batch_update with
+sortRange) with gspread's return shapes. Every call can be delayed by a
+fixed latency plus jitter and can fail with a gspread APIError, either at
+random (failure_rate) or on demand (fail_next).
+"""
+import json
+import random
+import threading
+import time
+
+import gspread
+import requests
+from gspread.utils import a1_to_rowcol
+
+
+def api_error(status: int = 503, message: str = "Injected failure") -> gspread.exceptions.APIError:
+    """An APIError as gspread raises it for an HTTP error response."""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(
+        {"error": {"code": status, "message": message, "status": "UNAVAILABLE"}}
+    ).encode("utf-8")
+    return gspread.exceptions.APIError(response)
+
+
+def _parse_range(a1: str):
+    """'A2:R', 'P2:R10', 'A5' -> (first row, last row or None, first col, last col), 1-based."""
+    a1 = a1.split("!")[-1]
+    start, _, end = a1.partition(":")
+    row0, col0 = a1_to_rowcol(start)
+    if not end:
+        return row0, row0, col0, col0
+    letters = "".join(ch for ch in end if ch.isalpha())
+    digits = end[len(letters):]
+    col1 = a1_to_rowcol(f"{letters}1")[1]
+    return row0, int(digits) if digits else None, col0, col1
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def batch_update(self, body: dict):
+        ws = self._worksheet
+        ws._call("spreadsheet.batch_update")
+        for request in body.get("requests", []):
+            sort = request.get("sortRange")
+            if sort is None:
+                continue
+            first = sort["range"].get("startRowIndex", 0)
+            with ws._lock:
+                rows = ws.rows[first:]
+                for spec in reversed(sort["sortSpecs"]):
+                    col = spec["dimensionIndex"]
+                    rows.sort(
+                        key=lambda r: r[col] if col < len(r) else "",
+                        reverse=spec.get("sortOrder") == "DESCENDING",
+                    )
+                ws.rows[first:] = rows
+        return {"replies": []}
+
+
+class FakeWorksheet:
+    """
+    rows: full sheet contents including the header row.
+    latency / jitter: seconds added to every call (time.sleep, so calls
+    block an executor thread like real HTTP requests do).
+    """
+
+    def __init__(self, rows: list, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = None, title: str = "Заявки"):
+        self.rows = [list(row) for row in rows]
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.title = title
+        self.id = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fail_next = 0
+        # {method name: number of calls}
+        self.calls = {}
+        self.failures = 0
+
+    def fail_next(self, count: int = 1):
+        """Make the next `count` calls raise APIError."""
+        self._fail_next += count
+
+    def reset_counters(self):
+        self.calls = {}
+        self.failures = 0
+
+    def _call(self, name: str):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            fail = self._fail_next > 0 or self._random.random() < self.failure_rate
+            if self._fail_next > 0:
+                self._fail_next -= 1
+            delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self.failures += 1
+            raise api_error()
+
+    def _cells(self, row0: int, row1, col0: int, col1: int) -> list:
+        """Values in the range, with trailing empty cells and rows trimmed like the API does."""
+        with self._lock:
+            selected = self.rows[row0 - 1:row1]
+        values = []
+        for row in selected:
+            cells = row[col0 - 1:col1]
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def row_values(self, row: int) -> list:
+        self._call("row_values")
+        values = self._cells(row, row, 1, None)
+        return values[0] if values else []
+
+    def get_all_values(self) -> list:
+        self._call("get_all_values")
+        with self._lock:
+            return [list(row) for row in self.rows]
+
+    def batch_get(self, ranges: list, **kwargs) -> list:
+        self._call("batch_get")
+        return [self._cells(*_parse_range(a1)) for a1 in ranges]
+
+    def append_rows(self, values: list, **kwargs) -> dict:
+        self._call("append_rows")
+        with self._lock:
+            first = len(self.rows) + 1
+            self.rows.extend(list(row) for row in values)
+            last = len(self.rows)
+        width = max((len(row) for row in values), default=1)
+        end = gspread.utils.rowcol_to_a1(last, width)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first}:{end}", "updatedRows": len(values)}}
+
+    def _set(self, row0: int, col0: int, values: list):
+        with self._lock:
+            for r, row_values in enumerate(values):
+                index = row0 - 1 + r
+                while len(self.rows) <= index:
+                    self.rows.append([])
+                row = self.rows[index]
+                for c, value in enumerate(row_values):
+                    col = col0 - 1 + c
+                    if len(row) <= col:
+                        row.extend([""] * (col + 1 - len(row)))
+                    row[col] = "" if value is None else str(value)
+
+    def batch_update(self, data: list, **kwargs) -> dict:
+        self._call("batch_update")
+        for item in data:
+            row0, _, col0, _ = _parse_range(item["range"])
+            self._set(row0, col0, item["values"])
+        return {"totalUpdatedCells": sum(len(v) for item in data for v in item["values"])}
+
+    def update(self, range_name: str, values: list, **kwargs) -> dict:
+        self._call("update")
+        row0, _, col0, _ = _parse_range(range_name)
+        self._set(row0, col0, values)
+        return {"updatedRange": range_name}
+
+    def freeze(self, rows: int = None, cols: int = None):
+        self._call("freeze")
@@ -5,16 +5,62 @@ from environs import Env
 class TgBot:
     token: str
     admin_ids: list[int]
+    global_rate: float = 30.0
+    per_chat_interval: float = 1.0
+    send_workers: int = 8
+    page_size: int = 5
+    outbox_workers: int = 4
+    outbox_max_attempts: int = 5
 
 @dataclass
 class GoogleSheets:
     service_account_file: str
     spreadsheet_id: str
+    workers: int = 4
+    call_timeout: float = 15.0
+    flush_interval_ms: int = 1000
+    flush_max_rows: int = 20
+    compact_interval: int = 300
+    sync_interval: int = 5
+    full_pull_interval: float = 1800.0
+    quota_per_minute: int = 60
+    quota_reserve: float = 0.25
+    breaker_failures: int = 5
+    breaker_slow_call: float = 5.0
+    breaker_cooldown: float = 30.0
+    user_cache_ttl: float = 30.0
+    user_cache_size: int = 5000
+
+@dataclass
+class Webhook:
+    mode: str
+    url: str
+    path: str
+    secret: str
+    host: str
+    port: int
+
+@dataclass
+class Poller:
+    min_interval: float
+    max_interval: float
+    work_max_interval: float
+    work_hours: str
+    timezone: str
+
+@dataclass
+class Storage:
+    data_dir: str
+    fsm_backend: str = "sqlite"
+    fsm_cache_size: int = 10000
 
 @dataclass
 class Config:
     tg_bot: TgBot
+    webhook: Webhook
     google_sheets: GoogleSheets
+    poller: Poller
+    storage: Storage
 
 def load_config(path: str = None):
     env = Env()
@@ -24,10 +70,50 @@ def load_config(path: str = None):
         tg_bot=TgBot(
             token=env.str("BOT_TOKEN"),
             admin_ids=list(map(int, env.list("ADMIN_IDS"))),
+            global_rate=env.float("TG_GLOBAL_RATE", 30.0),
+            per_chat_interval=env.float("TG_PER_CHAT_INTERVAL", 1.0),
+            send_workers=env.int("TG_SEND_WORKERS", 8),
+            page_size=env.int("MY_REQUESTS_PAGE_SIZE", 5),
+            outbox_workers=env.int("OUTBOX_WORKERS", 4),
+            outbox_max_attempts=env.int("OUTBOX_MAX_ATTEMPTS", 5),
+        ),
+        webhook=Webhook(
+            mode=env.str("BOT_MODE", "polling"),  # "polling" or "webhook"
+            url=env.str("WEBHOOK_URL", ""),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            secret=env.str("WEBHOOK_SECRET", ""),
+            host=env.str("WEB_SERVER_HOST", "0.0.0.0"),
+            port=env.int("PORT", 8080),
         ),
         google_sheets=GoogleSheets(
             service_account_file=env.str("GOOGLE_SERVICE_ACCOUNT_FILE", "service_account.json.example"),
             spreadsheet_id=env.str("GOOGLE_SPREADSHEET_ID", ""),
+            workers=env.int("SHEETS_WORKERS", 4),
+            call_timeout=env.float("SHEETS_CALL_TIMEOUT", 15.0),
+            flush_interval_ms=env.int("SHEETS_FLUSH_INTERVAL_MS", 1000),
+            flush_max_rows=env.int("SHEETS_FLUSH_MAX_ROWS", 20),
+            compact_interval=env.int("SHEETS_COMPACT_INTERVAL", 300),
+            sync_interval=env.int("SHEETS_SYNC_INTERVAL", 5),
+            full_pull_interval=env.float("SHEETS_FULL_PULL_INTERVAL", 1800.0),
+            quota_per_minute=env.int("SHEETS_QUOTA_PER_MINUTE", 60),
+            quota_reserve=env.float("SHEETS_QUOTA_RESERVE", 0.25),
+            breaker_failures=env.int("SHEETS_BREAKER_FAILURES", 5),
+            breaker_slow_call=env.float("SHEETS_BREAKER_SLOW_CALL", 5.0),
+            breaker_cooldown=env.float("SHEETS_BREAKER_COOLDOWN", 30.0),
+            user_cache_ttl=env.float("USER_CACHE_TTL", 30.0),
+            user_cache_size=env.int("USER_CACHE_SIZE", 5000),
+        ),
+        poller=Poller(
+            min_interval=env.float("POLL_MIN_INTERVAL", 10.0),
+            max_interval=env.float("POLL_MAX_INTERVAL", 600.0),
+            work_max_interval=env.float("POLL_WORK_MAX_INTERVAL", 60.0),
+            work_hours=env.str("POLL_WORK_HOURS", ""),  # e.g. "9-21"
+            timezone=env.str("POLL_TIMEZONE", "UTC"),
+        ),
+        storage=Storage(
+            data_dir=env.str("DATA_DIR", "data"),
+            fsm_backend=env.str("FSM_STORAGE", "sqlite"),  # "sqlite" or "memory"
+            fsm_cache_size=env.int("FSM_CACHE_SIZE", 10000),
         ),
     )
 
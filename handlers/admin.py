@@ -0,0 +1,17 @@
+import html
+import json
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from config import config
+from utils import metrics
+
+router = Router()
+
+@router.message(Command("stats"), F.from_user.id.in_(config.tg_bot.admin_ids))
+async def stats_handler(message: Message):
+    """Show internal metrics (Sheets client, caches, queues) to admins."""
+    snapshot = json.dumps(metrics.collect(), ensure_ascii=False, indent=2, default=str)
+    await message.answer(f"<pre>{html.escape(snapshot)}</pre>")
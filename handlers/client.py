@@ -1,5 +1,5 @@
 from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardRemove
+from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 import texts
@@ -38,7 +38,7 @@ async def process_city(message: Message, state: FSMContext):
 async def process_property_type(message: Message, state: FSMContext):
     await state.update_data(property_type=message.text)
     await state.set_state(ClientFSM.area)
-    await message.answer(texts.CLIENT_AREA, reply_markup=ReplyKeyboardRemove())
+    await message.answer(texts.CLIENT_AREA, reply_markup=reply.get_remove_kb())
 
 @router.message(ClientFSM.area)
 async def process_area(message: Message, state: FSMContext):
@@ -50,18 +50,21 @@ async def process_area(message: Message, state: FSMContext):
 async def process_stage(message: Message, state: FSMContext):
     await state.update_data(stage=message.text)
     await state.set_state(ClientFSM.description)
-    await message.answer(texts.CLIENT_DESCRIPTION, reply_markup=ReplyKeyboardRemove())
+    await message.answer(texts.CLIENT_DESCRIPTION, reply_markup=reply.get_remove_kb())
 
 @router.message(ClientFSM.description)
 async def process_description(message: Message, state: FSMContext):
     await state.update_data(description=message.text)
     data = await state.get_data()
     
-    # Save to Google Sheets
-    await google_sheets.append_request("Client", data, message.from_user.id)
+    # Journal the request; it is written to Google Sheets in background
+    if await google_sheets.append_request("Client", data, message.from_user.id) is None:
+        # Not stored: keep the state so resending the description retries
+        await message.answer(texts.REQUEST_SAVE_FAILED)
+        return
     
-    # Notify Owner
-    await notifications.notify_owner_client(data)
+    # Notify Owner (queued in the outbox, delivered in background)
+    await notifications.notify_owner_client(data, dedup_key=f"{message.chat.id}:{message.message_id}")
     
     # Notify User
     await message.answer(texts.CLIENT_COMPLETE.format(hours=texts.RESPONSE_HOURS))
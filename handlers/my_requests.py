@@ -1,12 +1,14 @@
 import logging
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest
 
 import texts
+from config import config
 from utils import google_sheets
+from utils.request_renderer import PAGE_CALLBACK, needs_edit, remember_rendered, render_requests_page
 from keyboards import reply
 
 router = Router()
@@ -17,10 +19,10 @@ class MyRequestsFSM(StatesGroup):
 @router.message(F.text == texts.MENU_MY_REQUESTS)
 async def my_requests_handler(message: Message, state: FSMContext):
     # Try to find by TG ID first
-    requests = await google_sheets.get_requests_by_user(str(message.from_user.id))
-    
-    if requests:
-        await show_requests_list(message, requests)
+    page = await google_sheets.get_requests_page(str(message.from_user.id), limit=config.tg_bot.page_size)
+
+    if page["requests"]:
+        await show_requests_list(message, page)
     else:
         # Ask for phone if not found by TG ID (or just as a fallback/search feature)
         # Spec says: "After pressing, the user enters a phone number or ID."
@@ -30,11 +32,11 @@ async def my_requests_handler(message: Message, state: FSMContext):
 @router.message(MyRequestsFSM.waiting_for_phone)
 async def search_requests_handler(message: Message, state: FSMContext):
     query = message.text.strip()
-    requests = await google_sheets.get_requests_by_user(query)
-    
-    if requests:
+    page = await google_sheets.get_requests_page(query, limit=config.tg_bot.page_size)
+
+    if page["requests"]:
         await state.clear()
-        await show_requests_list(message, requests)
+        await show_requests_list(message, page, query)
     else:
         await message.answer("Заявки не найдены. Попробуйте еще раз или вернитесь в меню.", reply_markup=reply.get_start_kb())
         # Keep state active to allow retry
@@ -42,63 +44,58 @@ async def search_requests_handler(message: Message, state: FSMContext):
 @router.message(F.text == "🔄 Обновить")
 async def refresh_requests_handler(message: Message):
     """Refresh and show the latest requests data"""
-    requests = await google_sheets.get_requests_by_user(str(message.from_user.id))
-    
-    if requests:
-        await show_requests_list(message, requests)
+    page = await google_sheets.get_requests_page(str(message.from_user.id), limit=config.tg_bot.page_size)
+
+    if page["requests"]:
+        await show_requests_list(message, page)
     else:
         await message.answer("У вас пока нет заявок.", reply_markup=reply.get_start_kb())
 
-async def show_requests_list(message: Message, requests: list):
-    text = "📂 <b>Ваши заявки:</b>\n\n"
-    
-    kb = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    for req in requests:
-        # Display: Request number, Type, Status, Date, Amount
-        req_id = req['id']
-        req_type = req['type']
-        status = req['status']
-        # Format date from YYYY-MM-DD HH:MM:SS to DD.MM.YYYY
-        date_raw = req['date']
-        if ' ' in date_raw:
-            date_part = date_raw.split(' ')[0]
-            if '-' in date_part:
-                date_parts = date_part.split('-')
-                date_formatted = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
-            else:
-                date_formatted = date_part
-        else:
-            date_formatted = date_raw
-            
-        amount = req['amount'] or ""
-        if amount:
-            # Add spaces as thousand separators
-            try:
-                amount_num = int(amount.replace(' ', ''))
-                amount_formatted = f"{amount_num:,}".replace(',', ' ')
-                amount_text = f" | сумма: {amount_formatted}"
-            except:
-                amount_text = f" | сумма: {amount}"
-        else:
-            amount_text = ""
-        
-        # Format according to requirements:
-        # «Заявка #123 | тип: Партнёр | статус: Смета готова | дата: 17.12.2025 | сумма: 150 000 (если есть) | [Детали]»
-        row_text = f"Заявка #{req_id} | тип: {req_type} | статус: {status} | дата: {date_formatted}{amount_text}"
-        text += f"{row_text}\n"
-        
-        # Add button for details
-        kb.inline_keyboard.append([
-            InlineKeyboardButton(text=f"[Детали]", callback_data=f"req_details_{req_id}")
-        ])
-        
-    # Add refresh button
-    kb.inline_keyboard.append([
-        InlineKeyboardButton(text="🔄 Обновить", callback_data="refresh_requests")
-    ])
-        
-    await message.answer(text, reply_markup=kb)
+def build_requests_page(page: dict, query: str = "", title: str = "📂 <b>Ваши заявки:</b>"):
+    """Text, keyboard and content hash for one page of requests."""
+    return render_requests_page(page, query, title, stale=google_sheets.data_is_stale())
+
+async def show_requests_list(message: Message, page: dict, query: str = ""):
+    text, kb, content_hash = build_requests_page(page, query)
+    sent = await message.answer(text, reply_markup=kb)
+    remember_rendered(sent.chat.id, sent.message_id, content_hash)
+
+async def _edit_requests_list(callback: CallbackQuery, text: str, kb: InlineKeyboardMarkup, content_hash: str):
+    message = callback.message
+    # Nothing changed since we last rendered this message: no API call at all
+    if not needs_edit(message.chat.id, message.message_id, content_hash):
+        return
+    try:
+        await message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest as e:
+        # Rendered before a restart, so we had no hash for it
+        if "message is not modified" not in str(e):
+            raise e
+    remember_rendered(message.chat.id, message.message_id, content_hash)
+
+@router.callback_query(F.data.startswith(f"{PAGE_CALLBACK}:"))
+async def requests_page_handler(callback: CallbackQuery):
+    """Next/previous page of a requests list; the cursor travels in the callback data."""
+    await callback.answer()
+
+    try:
+        _, direction, cursor, query = callback.data.split(":", 3)
+        identifier = query or str(callback.from_user.id)
+        page = await google_sheets.get_requests_page(
+            identifier, cursor=cursor, forward=direction == "n", limit=config.tg_bot.page_size
+        )
+        if not page["requests"]:
+            # The list changed since it was shown: start over from the newest
+            page = await google_sheets.get_requests_page(identifier, limit=config.tg_bot.page_size)
+        if not page["requests"]:
+            await callback.message.answer("У вас пока нет заявок.", reply_markup=reply.get_start_kb())
+            return
+
+        await _edit_requests_list(callback, *build_requests_page(page, query))
+
+    except Exception as e:
+        logging.error(f"Error paging requests: {e}")
+        await callback.message.answer("Ошибка при загрузке данных. Пожалуйста, попробуйте позже.")
 
 @router.callback_query(F.data.startswith("req_details_"))
 async def request_details_handler(callback: CallbackQuery):
@@ -151,7 +148,9 @@ async def request_details_handler(callback: CallbackQuery):
         if req_data.get('files'):
             # Provide info on files
             details_text += f"\n📂 <b>Вложения:</b> Есть вложения\n"
-            
+
+        if google_sheets.data_is_stale():
+            details_text += texts.STALE_DATA_NOTE
         await callback.message.answer(details_text)
         
     except Exception as e:
@@ -164,68 +163,12 @@ async def refresh_callback_handler(callback: CallbackQuery):
     await callback.answer("Обновление данных...")
     
     try:
-        requests = await google_sheets.get_requests_by_user(str(callback.from_user.id))
-        
-        if requests:
-            text = "📂 <b>Ваши заявки (обновлено):</b>\n\n"
-            
-            kb = InlineKeyboardMarkup(inline_keyboard=[])
-            
-            for req in requests:
-                # Display: Request number, Type, Status, Date, Amount
-                req_id = req['id']
-                req_type = req['type']
-                status = req['status']
-                # Format date from YYYY-MM-DD HH:MM:SS to DD.MM.YYYY
-                date_raw = req['date']
-                if ' ' in date_raw:
-                    date_part = date_raw.split(' ')[0]
-                    if '-' in date_part:
-                        date_parts = date_part.split('-')
-                        date_formatted = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
-                    else:
-                        date_formatted = date_part
-                else:
-                    date_formatted = date_raw
-                    
-                amount = req['amount'] or ""
-                if amount:
-                    # Add spaces as thousand separators
-                    try:
-                        amount_num = int(amount.replace(' ', ''))
-                        amount_formatted = f"{amount_num:,}".replace(',', ' ')
-                        amount_text = f" | сумма: {amount_formatted}"
-                    except:
-                        amount_text = f" | сумма: {amount}"
-                else:
-                    amount_text = ""
-                
-                # Format according to requirements:
-                # «Заявка #123 | тип: Партнёр | статус: Смета готова | дата: 17.12.2025 | сумма: 150 000 (если есть) | [Детали]»
-                row_text = f"Заявка #{req_id} | тип: {req_type} | статус: {status} | дата: {date_formatted}{amount_text}"
-                text += f"{row_text}\n"
-                
-                # Add button for details
-                kb.inline_keyboard.append([
-                    InlineKeyboardButton(text=f"[Детали]", callback_data=f"req_details_{req_id}")
-                ])
-                
-            # Add refresh button
-            kb.inline_keyboard.append([
-                InlineKeyboardButton(text="🔄 Обновить", callback_data="refresh_requests")
-            ])
-            
-            # Try to edit the message, but handle the case where content is the same
-            try:
-                await callback.message.edit_text(text, reply_markup=kb)
-            except TelegramBadRequest as e:
-                if "message is not modified" in str(e):
-                    # Message content hasn't changed, so we don't need to update it
-                    logging.info("Message content unchanged, skipping update")
-                    pass
-                else:
-                    # Some other Telegram error
-                    raise e
+        page = await google_sheets.get_requests_page(str(callback.from_user.id), limit=config.tg_bot.page_size)
+
+        if page["requests"]:
+            await _edit_requests_list(
+                callback, *build_requests_page(page, title="📂 <b>Ваши заявки (обновлено):</b>")
+            )
         else:
             await callback.message.answer("У вас пока нет заявок.", reply_markup=reply.get_start_kb())
             
@@ -1,5 +1,5 @@
 from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardRemove
+from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 import texts
@@ -21,10 +21,10 @@ async def process_role(message: Message, state: FSMContext):
     # If "Другое" is selected, ask for text input
     if role == texts.BTN_OTHER:
         await state.set_state(PartnerFSM.name)
-        await message.answer("Пожалуйста, уточните вашу роль:", reply_markup=ReplyKeyboardRemove())
+        await message.answer("Пожалуйста, уточните вашу роль:", reply_markup=reply.get_remove_kb())
     else:
         await state.set_state(PartnerFSM.name)
-        await message.answer(texts.PARTNER_NAME, reply_markup=ReplyKeyboardRemove())
+        await message.answer(texts.PARTNER_NAME, reply_markup=reply.get_remove_kb())
 
 # Step 2.2 Contacts
 @router.message(PartnerFSM.name)
@@ -64,7 +64,7 @@ async def process_city(message: Message, state: FSMContext):
 async def process_property_type(message: Message, state: FSMContext):
     await state.update_data(property_type=message.text)
     await state.set_state(PartnerFSM.area)
-    await message.answer(texts.PARTNER_AREA, reply_markup=ReplyKeyboardRemove())
+    await message.answer(texts.PARTNER_AREA, reply_markup=reply.get_remove_kb())
 
 @router.message(PartnerFSM.area)
 async def process_area(message: Message, state: FSMContext):
@@ -86,7 +86,7 @@ async def process_project_presence(message: Message, state: FSMContext):
     if answer == texts.BTN_YES_PROJECT:
         # Request file upload
         await state.set_state(PartnerFSM.project_file)
-        await message.answer(texts.PARTNER_PROJECT_UPLOAD, reply_markup=ReplyKeyboardRemove())
+        await message.answer(texts.PARTNER_PROJECT_UPLOAD, reply_markup=reply.get_remove_kb())
     else:
         # Skip to budget
         await state.set_state(PartnerFSM.budget)
@@ -124,7 +124,7 @@ async def process_project_file(message: Message, state: FSMContext):
 async def process_budget(message: Message, state: FSMContext):
     await state.update_data(budget=message.text)
     await state.set_state(PartnerFSM.comments)
-    await message.answer(texts.PARTNER_COMMENTS, reply_markup=ReplyKeyboardRemove())
+    await message.answer(texts.PARTNER_COMMENTS, reply_markup=reply.get_remove_kb())
 
 @router.message(PartnerFSM.comments)
 async def process_comments(message: Message, state: FSMContext):
@@ -140,7 +140,7 @@ async def process_terms_choice(message: Message, state: FSMContext):
     
     if choice == texts.PARTNER_TERMS_CUSTOM:
         await state.set_state(PartnerFSM.terms_custom)
-        await message.answer(texts.PARTNER_TERMS_DESCRIBE, reply_markup=ReplyKeyboardRemove())
+        await message.answer(texts.PARTNER_TERMS_DESCRIBE, reply_markup=reply.get_remove_kb())
     else:
         # Accepted 10%
         # Finish flow
@@ -154,13 +154,16 @@ async def process_terms_custom(message: Message, state: FSMContext):
 async def finish_partner_flow(message: Message, state: FSMContext):
     data = await state.get_data()
     
-    # Save to Sheets
-    await google_sheets.append_request("Партнер", data, message.from_user.id)
+    # Journal the request; it is written to Google Sheets in background
+    if await google_sheets.append_request("Партнер", data, message.from_user.id) is None:
+        # Not stored: keep the state so resending the last answer retries
+        await message.answer(texts.REQUEST_SAVE_FAILED)
+        return
     
-    # Notify Owner
+    # Notify Owner (queued in the outbox, delivered in background)
     files = data.get('files', [])
-    await notifications.notify_owner_partner(data, files)
+    await notifications.notify_owner_partner(data, files, dedup_key=f"{message.chat.id}:{message.message_id}")
     
     # Notify User
-    await message.answer(texts.PARTNER_COMPLETE, reply_markup=ReplyKeyboardRemove())
+    await message.answer(texts.PARTNER_COMPLETE, reply_markup=reply.get_remove_kb())
     await state.clear()
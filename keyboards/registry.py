@@ -0,0 +1,54 @@
+import functools
+
+from utils import metrics
+
+
+class KeyboardRegistry:
+    """
+    Builds each static keyboard once and hands out the same markup object
+    on every call. Markups are shared between handlers: never mutate them.
+    """
+
+    def __init__(self):
+        # {name: factory() -> markup}
+        self._factories = {}
+        self._markups = {}
+        self.builds = 0
+        self.hits = 0
+
+    def frozen(self, factory):
+        """
+        Decorator: register a keyboard factory and replace it with a getter
+        returning the prebuilt markup, so call sites stay unchanged.
+        """
+        name = factory.__name__
+        self._factories[name] = factory
+
+        @functools.wraps(factory)
+        def get():
+            return self.get(name)
+
+        get.build = factory
+        return get
+
+    def get(self, name: str):
+        markup = self._markups.get(name)
+        if markup is None:
+            markup = self._markups[name] = self._factories[name]()
+            self.builds += 1
+        else:
+            self.hits += 1
+        return markup
+
+    def build_all(self):
+        """Build every registered keyboard up front (at startup)."""
+        for name in self._factories:
+            if name not in self._markups:
+                self.get(name)
+
+    def stats(self) -> dict:
+        return {"keyboards": len(self._markups), "builds": self.builds, "hits": self.hits}
+
+
+registry = KeyboardRegistry()
+metrics.register("keyboards", registry.stats)
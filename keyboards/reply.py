@@ -1,8 +1,10 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
 import texts
+from keyboards.registry import registry
 
+@registry.frozen
 def get_start_kb() -> ReplyKeyboardMarkup:
     """
     Returns the new main menu keyboard
@@ -17,6 +19,7 @@ def get_start_kb() -> ReplyKeyboardMarkup:
         one_time_keyboard=False
     )
 
+@registry.frozen
 def get_role_selection_kb() -> ReplyKeyboardMarkup:
     """
     Selection between Client and Partner for "New Request" flow
@@ -27,6 +30,7 @@ def get_role_selection_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
 
+@registry.frozen
 def get_client_property_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     for text in [texts.BTN_APARTMENT, texts.BTN_HOUSE, texts.BTN_COMMERCIAL]:
@@ -34,6 +38,7 @@ def get_client_property_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_client_stage_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     items = [
@@ -47,6 +52,7 @@ def get_client_stage_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_partner_role_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     roles = [
@@ -58,6 +64,7 @@ def get_partner_role_kb() -> ReplyKeyboardMarkup:
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_partner_property_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     # Same as client but with "Other"? Spec says: Apartment, House, Commercial, Other
@@ -67,6 +74,7 @@ def get_partner_property_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_partner_stage_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     items = [
@@ -80,6 +88,7 @@ def get_partner_stage_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_partner_project_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     items = [texts.BTN_YES_PROJECT, texts.BTN_PLAN_SCHEME, texts.BTN_NO_PROJECT]
@@ -88,6 +97,7 @@ def get_partner_project_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_partner_budget_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     items = [
@@ -98,6 +108,7 @@ def get_partner_budget_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_partner_terms_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.button(text=texts.PARTNER_TERMS_ACCEPT)
@@ -105,9 +116,14 @@ def get_partner_terms_kb() -> ReplyKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True)
 
+@registry.frozen
 def get_done_kb() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.button(text="Готово")
     builder.adjust(1)
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
-    
+
+@registry.frozen
+def get_remove_kb() -> ReplyKeyboardRemove:
+    """Hides the reply keyboard for free-text steps"""
+    return ReplyKeyboardRemove()
@@ -2,11 +2,21 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from config import config
+from utils import metrics
+from utils.fsm_storage import SQLiteStorage, FSMFlushMiddleware
 
 from aiogram.client.default import DefaultBotProperties
 
 # config = load_config() removed, imported above
 
 bot = Bot(token=config.tg_bot.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+
+if config.storage.fsm_backend == "memory":
+    storage = MemoryStorage()
+    dp = Dispatcher(storage=storage)
+else:
+    # Forms survive restarts; state changes are written once per update
+    storage = SQLiteStorage(cache_size=config.storage.fsm_cache_size)
+    dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(FSMFlushMiddleware(storage))
+    metrics.register("fsm_storage", storage.stats)
@@ -4,19 +4,111 @@ import sys
 import time
 import os
 
+from aiohttp import web
 from aiogram.exceptions import TelegramRetryAfter, TelegramAPIError, TelegramConflictError
-from loader import dp, bot
-from handlers import start, client, partner, common, my_requests
-from utils import poller
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import config
+from loader import dp, bot, storage
+from handlers import start, client, partner, common, my_requests, admin
+from utils import poller, google_sheets, local_db
+from utils.notify_dispatcher import notification_dispatcher
+from keyboards.registry import registry
+from utils.outbox import outbox
+
+async def on_shutdown() -> None:
+    # Write out submissions and edits not yet in the sheet; whatever fails
+    # stays in the journal or the local mirror and is synced on next start
+    await google_sheets.request_journal.stop()
+    await google_sheets.write_queue.stop()
+    try:
+        await google_sheets.push_changes()
+    except Exception as e:
+        logging.error(f"Error pushing local changes on shutdown: {e}")
+    # Undelivered notifications stay in the outbox for the next start
+    await outbox.stop()
+    # Flush pending FSM writes
+    await storage.close()
 
 async def main() -> None:
+    # Unsynced requests and notifications live under DATA_DIR
+    local_db.warn_if_ephemeral()
+
     # Register routers
     dp.include_router(start.router)
+    dp.include_router(admin.router)
     dp.include_router(common.router)
     dp.include_router(my_requests.router)
     dp.include_router(client.router)
     dp.include_router(partner.router)
+    dp.shutdown.register(on_shutdown)
+
+    # Static keyboards are built once and shared by all handlers
+    registry.build_all()
+
+    print("Bot started!")
+    
+    # Connect to Google Sheets once and keep the token fresh in background
+    asyncio.create_task(google_sheets.sheet_manager.run_refresher())
+    asyncio.create_task(google_sheets.request_journal.run())
+    asyncio.create_task(google_sheets.write_queue.run())
+    asyncio.create_task(google_sheets.run_compactor())
+    asyncio.create_task(google_sheets.run_sync())
+
+    # Rate-limited sender for user notifications and the durable queue feeding it
+    notification_dispatcher.start(bot)
+    outbox.start()
+
+    # Start polling task in background
+    asyncio.create_task(poller.start_status_polling(bot))
+
+    if config.webhook.mode == "webhook":
+        await run_webhook()
+    else:
+        await run_polling()
 
+async def health_handler(request: web.Request) -> web.Response:
+    # Public endpoint: liveness only; metrics are for admins via /stats
+    return web.json_response({"status": "ok", "mode": config.webhook.mode})
+
+async def run_webhook() -> None:
+    """Receive updates via an embedded aiohttp server instead of getUpdates."""
+    if not config.webhook.url:
+        logging.error("BOT_MODE=webhook requires WEBHOOK_URL. Exiting.")
+        sys.exit(1)
+    # Without a secret anyone who knows the URL could post forged updates
+    if not config.webhook.secret:
+        logging.error("BOT_MODE=webhook requires WEBHOOK_SECRET. Exiting.")
+        sys.exit(1)
+
+    app = web.Application()
+    # Telegram sends the secret in X-Telegram-Bot-Api-Secret-Token; others get 401
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=config.webhook.secret
+    ).register(app, path=config.webhook.path)
+    app.router.add_get("/health", health_handler)
+    # Runs dp startup/shutdown hooks together with the web app
+    setup_application(app, dp, bot=bot)
+
+    await bot.set_webhook(
+        f"{config.webhook.url.rstrip('/')}{config.webhook.path}",
+        secret_token=config.webhook.secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+    logging.info("Webhook set successfully")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.webhook.host, config.webhook.port)
+    await site.start()
+    logging.info(f"Webhook server listening on {config.webhook.host}:{config.webhook.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def run_polling() -> None:
+    """Long polling fallback."""
     # Delete webhook/drop pending updates to prevent spam on restart
     try:
         await bot.delete_webhook(drop_pending_updates=True)
@@ -24,11 +116,6 @@ async def main() -> None:
     except Exception as e:
         logging.warning(f"Could not delete webhook: {e}")
 
-    print("Bot started!")
-    
-    # Start polling task in background
-    asyncio.create_task(poller.start_status_polling(bot))
-    
     # Retry mechanism for polling
     retry_count = 0
     max_retries = 10
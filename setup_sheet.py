@@ -46,9 +46,31 @@ def ensure_headers(sheet):
     else:
         print("Headers already match specification.")
 
+def sort_requests(sheet):
+    """
+    Re-sort the data rows: Clients first, then Partners, sorted by Date/Time
+    within each user type. A single sortRange request.
+    """
+    sheet.spreadsheet.batch_update({
+        "requests": [{
+            "sortRange": {
+                "range": {
+                    "sheetId": sheet.id,
+                    "startRowIndex": 1,  # Skip header row
+                    "startColumnIndex": 0,
+                    "endColumnIndex": len(HEADERS),
+                },
+                "sortSpecs": [
+                    {"dimensionIndex": 2, "sortOrder": "ASCENDING"},  # Тип пользователя: Заказчик < Партнер
+                    {"dimensionIndex": 1, "sortOrder": "ASCENDING"},  # Дата/время
+                ],
+            }
+        }]
+    })
+
 def append_request(sheet, data: dict):
     """
-    Append a request to the sheet with proper ordering:
+    Append a request at the end of the sheet, then restore the ordering:
     Clients first, then Partners, sorted by Date/Time within each user type
     """
     ensure_headers(sheet)  # Check and fix headers before adding
@@ -56,26 +78,11 @@ def append_request(sheet, data: dict):
     # Create row with all required fields in correct order
     row = [data.get(header, "") for header in HEADERS]
     
-    # Get all existing data
-    all_values = sheet.get_all_values()
-    data_rows = all_values[1:] if len(all_values) > 1 else []
-    
-    # Default insertion point is at the end
-    insert_index = len(data_rows) + 2
-    
-    # Logic for insertion: Clients first, then Partners
-    user_type = data.get("Тип пользователя", "")
-    if user_type == "Заказчик":  # Client
-        # Insert among clients or at the beginning of the data section
-        insert_index = 2  # Start after header
-        for i, r in enumerate(data_rows, start=2):
-            # If we find a partner record, insert here
-            if len(r) > 2 and r[2] == "Партнер":
-                insert_index = i
-                break
-    
-    sheet.insert_row(row, insert_index)
-    print(f"Заявка добавлена в строку {insert_index}.")
+    sheet.append_row(row, table_range="A1")
+    # Clients appended after partners are moved up by the sort
+    if data.get("Тип пользователя", "") == "Заказчик":
+        sort_requests(sheet)
+    print("Заявка добавлена.")
 
 def setup_google_sheet():
     """Initialize the Google Sheet with proper headers and formatting"""
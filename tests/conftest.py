@@ -0,0 +1,75 @@
+"""
+Tests run offline against benchmarks/fake_gspread.py. The environment is
+set before config is imported; every test gets fresh module state
+(mirror, index, queues, journal) under its own tmp_path.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("BOT_TOKEN", "0:test")
+os.environ.setdefault("ADMIN_IDS", "0")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bot_tests_")
+# Tests measure behaviour, not the production quota
+os.environ["SHEETS_QUOTA_PER_MINUTE"] = "1000000"
+
+import asyncio
+
+import pytest
+
+from benchmarks.fake_gspread import FakeWorksheet
+from utils import google_sheets as gs
+from utils.id_allocator import IdAllocator
+from utils.journal import Journal
+from utils.mirror import RequestMirror
+from utils.request_index import RequestIndex
+from utils.user_cache import UserRequestsCache
+from utils.write_queue import WriteBehindQueue
+
+
+CLIENT_FORM = {"name": "Test", "phone": "+7 900 000 00 00", "description": "Wiring"}
+
+
+def make_row(req_id, tg_id="100", status="Новая", user_type="Заказчик", comment="") -> list:
+    row = [""] * len(gs.HEADERS)
+    row[gs.COL_ID] = str(req_id)
+    row[gs.COL_DATE] = f"2024-01-01 00:00:{int(req_id) % 60:02d}"
+    row[gs.COL_USER_TYPE] = user_type
+    row[gs.COL_STATUS] = status
+    row[gs.COL_COMMENT] = comment
+    row[gs.COL_TG_ID] = str(tg_id)
+    return row
+
+
+def sheet_row(ws, req_id) -> list:
+    return next(row for row in ws.rows[1:] if row[gs.COL_ID] == req_id)
+
+
+@pytest.fixture
+def sheets(monkeypatch, tmp_path):
+    """
+    google_sheets wired to an in-memory worksheet with requests 1..5.
+    Returns the FakeWorksheet; its .rows are the sheet (header included).
+    """
+    ws = FakeWorksheet([gs.HEADERS] + [make_row(i) for i in range(1, 6)])
+    monkeypatch.setattr(gs.sheet_manager, "_sheet", ws)
+    monkeypatch.setattr(gs, "mirror", RequestMirror(len(gs.HEADERS), db_name=str(tmp_path / "mirror.db")))
+    monkeypatch.setattr(gs, "request_index", RequestIndex())
+    monkeypatch.setattr(gs, "id_allocator", IdAllocator(name=str(tmp_path)))
+    cache = UserRequestsCache(ttl=30, max_size=100)
+    cache.prepare = gs._reload_index_for_cache
+    monkeypatch.setattr(gs, "user_requests_cache", cache)
+    monkeypatch.setattr(gs, "write_queue", WriteBehindQueue(
+        gs._write_rows, flush_interval_ms=1000, max_rows=20, restore=gs._restore_rows,
+    ))
+    monkeypatch.setattr(gs, "request_journal", Journal(str(tmp_path / "requests.jsonl"), gs._replay_request))
+    monkeypatch.setattr(gs, "_index_lock", asyncio.Lock())
+    for name, value in [
+        ("_index_warm", False), ("_last_pull", None), ("_index_load_failed", False),
+        ("_ids_reconciled", False), ("_append_uncertain", False), ("_needs_compaction", False),
+    ]:
+        monkeypatch.setattr(gs, name, value)
+    return ws
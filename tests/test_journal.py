@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from utils import google_sheets as gs
+from utils.journal import Journal
+
+from conftest import CLIENT_FORM, make_row, sheet_row
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.jobs = {}
+
+    async def enqueue(self, kind, chat_id, payload, dedup_key=None):
+        self.jobs[dedup_key] = (kind, chat_id, payload)
+        return True
+
+
+def test_records_past_the_checkpoint_are_replayed_after_a_crash(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    applied = []
+
+    async def crash_on_second(record):
+        if record["n"] == 2:
+            raise RuntimeError("crash")
+        applied.append(record["n"])
+
+    async def before_crash():
+        journal = Journal(path, crash_on_second)
+        for n in range(1, 4):
+            await journal.append({"n": n})
+        with pytest.raises(RuntimeError):
+            await journal.replay()
+
+    async def apply(record):
+        applied.append(record["n"])
+
+    async def after_restart():
+        journal = Journal(path, apply)
+        await journal.stop()
+        return journal
+
+    asyncio.run(before_crash())
+    journal = asyncio.run(after_restart())
+    assert applied == [1, 2, 3]
+    assert journal.checkpoint == 3
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    applied = []
+
+    async def apply(record):
+        applied.append(record["n"])
+
+    async def write():
+        journal = Journal(str(path), apply)
+        await journal.append({"n": 1})
+
+    async def restart():
+        journal = Journal(str(path), apply)
+        await journal.stop()
+        await journal.append({"n": 2})
+        await journal.replay()
+
+    asyncio.run(write())
+    with open(path, "ab") as f:
+        f.write(b'{"seq": 2, "n": "torn')
+    asyncio.run(restart())
+    assert applied == [1, 2]
+    assert b"torn" not in path.read_bytes()
+
+
+def test_submission_replayed_after_a_crash_is_written_once(sheets):
+    async def scenario():
+        req_id = str(await gs.append_request("Заказчик", CLIENT_FORM, 200))
+        record = gs.request_journal._pending[0]
+        # Applied, but the process died before the checkpoint was stored
+        await gs._replay_request(record)
+        await gs.request_journal.replay()
+        await gs.write_queue.flush()
+        return req_id
+
+    req_id = asyncio.run(scenario())
+    assert [row[gs.COL_ID] for row in sheets.rows[1:]].count(req_id) == 1
+    assert len(gs.mirror.pending_inserts()) == 0
+
+
+def test_first_id_on_a_fresh_data_dir_follows_the_sheet(sheets):
+    async def scenario():
+        return await gs.append_request("Заказчик", CLIENT_FORM, 200)
+
+    assert asyncio.run(scenario()) == 6
+
+
+def test_id_taken_in_the_sheet_is_renumbered_on_replay(sheets, monkeypatch):
+    outbox = RecordingOutbox()
+    monkeypatch.setattr(gs, "outbox", outbox)
+
+    async def scenario():
+        sheets.fail_next(1)
+        # The sheet is down: the sequence can't be reconciled, ID 1 is reused
+        req_id = await gs.append_request("Заказчик", CLIENT_FORM, 200)
+        await gs.request_journal.replay()
+        await gs.write_queue.flush()
+        return req_id
+
+    assert asyncio.run(scenario()) == 1
+    assert sheet_row(sheets, "6")[gs.COL_TG_ID] == "200"
+    assert sheet_row(sheets, "1") == make_row(1)
+    kind, chat_id, payload = outbox.jobs["renumbered:1"]
+    assert (kind, chat_id) == ("user_status", 200)
+    assert "#6" in payload["text"]
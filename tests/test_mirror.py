@@ -0,0 +1,94 @@
+from utils.columns import COL_COMMENT, COL_STATUS
+from utils.mirror import RequestMirror
+
+from conftest import make_row
+
+WIDTH = 18
+
+
+def sheet(*rows) -> list:
+    return [["header"] * WIDTH] + [list(row) for row in rows]
+
+
+def mirror_with(tmp_path, *rows) -> RequestMirror:
+    mirror = RequestMirror(WIDTH, db_name=str(tmp_path / "mirror.db"))
+    mirror.pull(sheet(*rows))
+    return mirror
+
+
+def test_pull_takes_sheet_edits_to_clean_rows(tmp_path):
+    mirror = mirror_with(tmp_path, make_row(1), make_row(2))
+    mirror.pull(sheet(make_row(1, status="Готово"), make_row(2)))
+
+    assert mirror.get_row("1")[COL_STATUS] == "Готово"
+    assert mirror.dirty_rows() == []
+    assert mirror.conflicts == 0
+
+
+def test_local_edit_is_kept_while_sheet_cell_is_unchanged(tmp_path):
+    mirror = mirror_with(tmp_path, make_row(1))
+    mirror.update_local({"1": {COL_COMMENT: "call back"}})
+    mirror.pull(sheet(make_row(1)))
+
+    assert mirror.get_row("1")[COL_COMMENT] == "call back"
+    assert mirror.dirty_rows() == [("1", 2, {COL_COMMENT: "call back"})]
+
+
+def test_conflict_on_status_is_won_by_the_sheet(tmp_path):
+    mirror = mirror_with(tmp_path, make_row(1))
+    mirror.update_local({"1": {COL_STATUS: "В работе"}})
+    mirror.merge_remote({"1": {COL_STATUS: "Отменено"}})
+
+    assert mirror.get_row("1")[COL_STATUS] == "Отменено"
+    assert mirror.dirty_rows() == []
+    assert mirror.conflicts == 1
+
+
+def test_conflict_on_other_columns_is_won_locally(tmp_path):
+    mirror = mirror_with(tmp_path, make_row(1))
+    mirror.update_local({"1": {COL_COMMENT: "ours"}})
+    mirror.pull(sheet(make_row(1, comment="theirs")))
+
+    assert mirror.get_row("1")[COL_COMMENT] == "ours"
+    assert mirror.dirty_rows() == [("1", 2, {COL_COMMENT: "ours"})]
+    assert mirror.conflicts == 1
+
+
+def test_same_edit_on_both_sides_is_not_a_conflict(tmp_path):
+    mirror = mirror_with(tmp_path, make_row(1))
+    mirror.update_local({"1": {COL_STATUS: "Готово"}})
+    mirror.merge_remote({"1": {COL_STATUS: "Готово"}})
+
+    assert mirror.dirty_rows() == []
+    assert mirror.conflicts == 0
+
+
+def test_pull_drops_deleted_rows_but_keeps_pending_inserts(tmp_path):
+    mirror = mirror_with(tmp_path, make_row(1), make_row(2))
+    mirror.insert_local(make_row(3))
+    mirror.pull(sheet(make_row(1)))
+
+    assert mirror.get_row("2") is None
+    assert [row[0] for row in mirror.pending_inserts()] == ["3"]
+
+
+def test_edit_to_pending_row_is_pushed_if_the_append_missed_it(tmp_path):
+    mirror = mirror_with(tmp_path)
+    mirror.insert_local(make_row(1))
+    queued = mirror.pending_inserts()[0]
+    mirror.update_local({"1": {COL_STATUS: "Готово"}})
+    # The append went out with the values read before the edit
+    mirror.mark_inserted([(2, queued)])
+
+    assert mirror.sync_states(["1"]) == {"1": "dirty"}
+    assert mirror.dirty_rows() == [("1", 2, {COL_STATUS: "Готово"})]
+
+
+def test_edit_to_pending_row_carried_by_the_append_is_synced(tmp_path):
+    mirror = mirror_with(tmp_path)
+    mirror.insert_local(make_row(1))
+    mirror.update_local({"1": {COL_STATUS: "Готово"}})
+    mirror.mark_inserted([(2, mirror.pending_inserts()[0])])
+
+    assert mirror.sync_states(["1"]) == {"1": "synced"}
+    assert mirror.dirty_rows() == []
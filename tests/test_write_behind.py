@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from utils import google_sheets as gs
+
+from conftest import CLIENT_FORM, sheet_row
+
+
+async def submit(tg_id=200) -> str:
+    """A completed form, replayed into the mirror and queued for the sheet."""
+    req_id = await gs.append_request("Заказчик", CLIENT_FORM, tg_id)
+    await gs.request_journal.replay()
+    return str(req_id)
+
+
+def test_status_change_before_flush_reaches_the_sheet(sheets):
+    async def scenario():
+        req_id = await submit()
+        assert await gs.update_requests([(req_id, "В работе")]) == {req_id: "queued"}
+        await gs.write_queue.flush()
+        return req_id
+
+    req_id = asyncio.run(scenario())
+    assert sheet_row(sheets, req_id)[gs.COL_STATUS] == "В работе"
+    assert gs.mirror.sync_states([req_id]) == {req_id: "synced"}
+
+
+def test_status_change_during_the_append_is_pushed_after_it(sheets):
+    append_rows = sheets.append_rows
+
+    def slow_append(values, **kwargs):
+        time.sleep(0.2)
+        return append_rows(values, **kwargs)
+
+    async def scenario():
+        req_id = await submit()
+        sheets.append_rows = slow_append
+        flush = asyncio.create_task(gs.write_queue.flush())
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(gs.mirror.update_local, {req_id: {gs.COL_STATUS: "Готово"}})
+        await flush
+        assert sheet_row(sheets, req_id)[gs.COL_STATUS] == "Новая"
+        await gs.push_changes()
+        return req_id
+
+    req_id = asyncio.run(scenario())
+    assert sheet_row(sheets, req_id)[gs.COL_STATUS] == "Готово"
+    assert gs.mirror.dirty_rows() == []
+
+
+def test_update_of_a_row_deleted_from_the_sheet_is_not_found(sheets):
+    async def scenario():
+        await gs.ensure_index(await gs.get_async_service())
+        del sheets.rows[2]  # request 2, deleted by hand
+        return await gs.update_requests([("2", "Готово"), ("3", "Готово")])
+
+    assert asyncio.run(scenario()) == {"2": "not_found", "3": "updated"}
+    assert sheet_row(sheets, "3")[gs.COL_STATUS] == "Готово"
@@ -41,6 +41,12 @@ HELP_MSG = """
 Для проверки статуса заявок нажмите "👤 Мои заявки".
 """
 
+# Shown under request data served from the local copy while Google Sheets is down
+STALE_DATA_NOTE = "\n⚠️ <i>Данные могут быть неактуальны: Google Таблица временно недоступна.</i>"
+
+# The completed form could not be saved; the FSM state is kept so resending retries
+REQUEST_SAVE_FAILED = "⚠️ Не удалось сохранить заявку. Пожалуйста, отправьте последнее сообщение ещё раз."
+
 # Client Flow
 CLIENT_NAME = _data.get("CLIENT_NAME", "")
 CLIENT_PHONE = _data.get("CLIENT_PHONE", "")
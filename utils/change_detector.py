@@ -0,0 +1,56 @@
+import logging
+
+
+class ChangeDetector:
+    """
+    Cheap "did the spreadsheet change?" check run before each full poll.
+    check() returns True when a poll is needed; acknowledge() is called after
+    a successful poll so the revision seen by check() counts as processed.
+    tracks_revision: check() is True only when the spreadsheet really changed.
+    """
+
+    tracks_revision = False
+
+    async def check(self) -> bool:
+        raise NotImplementedError
+
+    def acknowledge(self):
+        pass
+
+
+class AlwaysChanged(ChangeDetector):
+    """Fallback that never skips a poll."""
+
+    async def check(self) -> bool:
+        return True
+
+
+class RevisionChangeDetector(ChangeDetector):
+    """
+    Compares a revision token (e.g. Drive file version / modifiedTime)
+    with the one from the last processed poll.
+    fetch_revision: async callable returning the current token.
+    """
+
+    def __init__(self, fetch_revision):
+        self._fetch_revision = fetch_revision
+        self._seen = None
+        self._pending = None
+
+    async def check(self) -> bool:
+        try:
+            self._pending = await self._fetch_revision()
+        except Exception as e:
+            # Fail open: a failed metadata call must not hide changes
+            logging.warning(f"Could not fetch spreadsheet revision: {e}")
+            self._pending = None
+            return True
+        return self._pending is None or self._pending != self._seen
+
+    def acknowledge(self):
+        self._seen = self._pending
+
+    @property
+    def tracks_revision(self) -> bool:
+        # A failed revision fetch reports "changed" without knowing
+        return self._pending is not None
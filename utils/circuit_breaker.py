@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service the breaker considers down."""
+
+
+class CircuitBreaker:
+    """
+    Trips after `failure_threshold` consecutive bad calls: errors, timeouts,
+    or calls slower than `slow_call` seconds. While open, calls fail at once
+    and a background task runs `probe` (async, raises on failure) every
+    `cooldown` seconds, doubling up to `max_cooldown`, until it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, slow_call: float, cooldown: float,
+                 max_cooldown: float = 300, on_close=None):
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        # async probe() -> None; set by the owner of the protected service
+        self.probe = None
+        # Called after recovery, e.g. to refresh data served while open
+        self.on_close = on_close
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probe_task = None
+        self.trips = 0
+        self.rejected = 0
+        self.probes = 0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, duration: float, error: Exception = None):
+        if self.state != CLOSED:
+            return
+        if error is None and duration < self.slow_call:
+            self._failures = 0
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            reason = f"error: {error}" if error is not None else f"slow calls ({duration:.1f}s)"
+            self._trip(reason)
+
+    def _trip(self, reason: str):
+        self.state = OPEN
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        logging.warning(f"Circuit breaker opened after {self._failures} bad calls, last {reason}")
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        delay = self.cooldown
+        while True:
+            await asyncio.sleep(delay)
+            self.state = HALF_OPEN
+            self.probes += 1
+            started = time.monotonic()
+            try:
+                await self.probe()
+                if time.monotonic() - started >= self.slow_call:
+                    raise TimeoutError("probe too slow")
+            except Exception as e:
+                self.state = OPEN
+                delay = min(delay * 2, self.max_cooldown)
+                logging.info(f"Circuit breaker probe failed ({e}), next probe in {delay:.0f}s")
+                continue
+            break
+
+        self.state = CLOSED
+        self._failures = 0
+        logging.info(f"Circuit breaker closed after {time.monotonic() - self._opened_at:.0f}s")
+        if self.on_close is not None:
+            self.on_close()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "open_for_sec": round(time.monotonic() - self._opened_at) if self.state != CLOSED else 0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "probes": self.probes,
+        }
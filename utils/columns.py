@@ -0,0 +1,21 @@
+# Column Indices (0-based) of the request sheet, shared by everything that reads its rows
+# Sheet Structure:
+# ID заявки | Дата/время | Тип пользователя | Роль партнёра | Имя | Телефон | Telegram @ | Город / район | Тип объекта | Площадь (м²) | Стадия ремонта/объекта | Наличие проекта | Примерный бюджет по электрике | Комментарий | Условия партнёрства | Статус заявки | Сумма | ID пользователя/чата в Telegram
+COL_ID = 0
+COL_DATE = 1
+COL_USER_TYPE = 2
+COL_PARTNER_ROLE = 3
+COL_NAME = 4
+COL_PHONE = 5
+COL_TELEGRAM = 6
+COL_CITY = 7
+COL_PROP_TYPE = 8
+COL_AREA = 9
+COL_STAGE = 10
+COL_PROJECT = 11
+COL_BUDGET = 12
+COL_COMMENT = 13
+COL_PARTNERSHIP_TERMS = 14
+COL_STATUS = 15
+COL_AMOUNT = 16
+COL_TG_ID = 17
@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import copy
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.types import TelegramObject
+
+from utils import local_db
+
+
+def _key(key: StorageKey) -> str:
+    return (
+        f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id}:"
+        f"{key.business_connection_id}:{key.destiny}"
+    )
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Persistent FSM storage in SQLite (WAL mode) with an in-memory LRU of hot chats.
+    set_state/set_data/update_data only touch the cache and mark the key dirty;
+    FSMFlushMiddleware calls flush() once per update, so all the calls a
+    handler makes end up as a single write.
+    """
+
+    def __init__(self, db_name: str = "fsm.db", cache_size: int = 10000):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._conn = None
+        # {key: [state, data]}, most recently used last
+        self._cache = collections.OrderedDict()
+        self._dirty = set()
+        # One flush at a time: a snapshot is never written after a newer one
+        self._flush_lock = asyncio.Lock()
+        self._db_name = db_name
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.writes = 0
+        self.rows_written = 0
+        self._read_time = 0.0
+        self._write_time = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = local_db.connect(self._db_name)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL)"
+            )
+        return self._conn
+
+    def _load(self, key: str):
+        started = time.monotonic()
+        with self._lock:
+            row = self._db().execute("SELECT state, data FROM fsm WHERE key = ?", (key,)).fetchone()
+        self._read_time += time.monotonic() - started
+        if row is None:
+            return [None, {}]
+        return [row[0], json.loads(row[1])]
+
+    async def _entry(self, key: StorageKey) -> list:
+        k = _key(key)
+        entry = self._cache.get(k)
+        if entry is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(k)
+            return entry
+
+        self.cache_misses += 1
+        entry = await asyncio.to_thread(self._load, k)
+        # Another coroutine may have loaded (or changed) it meanwhile
+        entry = self._cache.setdefault(k, entry)
+        self._evict()
+        return entry
+
+    def _evict(self):
+        # Only clean entries can be dropped; dirty ones wait for the next flush
+        while len(self._cache) > self.cache_size:
+            for k in self._cache:
+                if k not in self._dirty:
+                    del self._cache[k]
+                    break
+            else:
+                return
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        self._dirty.add(_key(key))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry[1] = copy.deepcopy(dict(data))
+        self._dirty.add(_key(key))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._entry(key))[1])
+
+    def _write(self, entries: list):
+        started = time.monotonic()
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db):
+                for k, state, data in entries:
+                    if state is None and not data:
+                        db.execute("DELETE FROM fsm WHERE key = ?", (k,))
+                    else:
+                        db.execute(
+                            "INSERT OR REPLACE INTO fsm (key, state, data) VALUES (?, ?, ?)",
+                            (k, state, json.dumps(data, ensure_ascii=False, default=str)),
+                        )
+        self._write_time += time.monotonic() - started
+
+    async def flush(self) -> None:
+        """
+        Write all dirty keys in one transaction. Concurrent flushes run one
+        after another; keys dirtied while one waits go out in its batch.
+        """
+        if not self._dirty:
+            return
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            # set_data replaces the dict rather than mutating it, so references are safe
+            entries = [(k, self._cache[k][0], self._cache[k][1]) for k in dirty if k in self._cache]
+            try:
+                await asyncio.to_thread(self._write, entries)
+            except Exception as e:
+                # Keep them dirty so the next flush retries
+                self._dirty |= dirty
+                logging.error(f"Error writing FSM state: {e}")
+                return
+            self.writes += 1
+            self.rows_written += len(entries)
+
+    async def close(self) -> None:
+        await self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        reads = max(1, self.cache_misses)
+        writes = max(1, self.writes)
+        return {
+            "cached_chats": len(self._cache),
+            "dirty": len(self._dirty),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "avg_read_ms": round(self._read_time / reads * 1000, 2),
+            "avg_write_ms": round(self._write_time / writes * 1000, 2),
+        }
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """Outer update middleware: one storage flush after each handled update."""
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            await self.storage.flush()
@@ -1,19 +1,30 @@
+import asyncio
+import bisect
 import datetime
+import time
 import gspread
 import traceback
+import zlib
 import logging
-import json
-import os
-from google.oauth2.service_account import Credentials
 from config import config
-
-# Scope required for accessing Google Sheets and Drive
-SCOPES = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive",
-]
+from utils import metrics
+from gspread.urls import DRIVE_FILES_API_V3_URL
+from utils.sheets_client import SheetClientManager
+from utils.sheets_executor import AsyncWorksheet, quota_governor, sheets_breaker, sheets_executor
+from utils.circuit_breaker import CLOSED, CircuitOpenError
+from utils.quota_governor import Lane, lane, set_lane
+from utils.columns import (
+    COL_ID, COL_DATE, COL_USER_TYPE, COL_PARTNER_ROLE, COL_NAME, COL_PHONE, COL_TELEGRAM,
+    COL_CITY, COL_PROP_TYPE, COL_AREA, COL_STAGE, COL_PROJECT, COL_BUDGET, COL_COMMENT,
+    COL_PARTNERSHIP_TERMS, COL_STATUS, COL_AMOUNT, COL_TG_ID,
+)
+from utils.request_index import RequestIndex, request_index
+from utils.write_queue import WriteBehindQueue
+from utils.id_allocator import id_allocator
+from utils.journal import Journal
+from utils.mirror import RequestMirror
+from utils.outbox import outbox
+from utils.user_cache import UserRequestsCache
 
 # Headers matching specification exactly (Russian names as per requirement)
 HEADERS = [
@@ -35,62 +46,41 @@ ENGLISH_STATUS_VALUES = [
     "Completed", "Paid", "Cancelled"
 ]
 
-# Column Indices (0-based) for consistency
-# Sheet Structure:
-# ID заявки | Дата/время | Тип пользователя | Роль партнёра | Имя | Телефон | Telegram @ | Город / район | Тип объекта | Площадь (м²) | Стадия ремонта/объекта | Наличие проекта | Примерный бюджет по электрике | Комментарий | Условия партнёрства | Статус заявки | Сумма | ID пользователя/чата в Telegram
-COL_ID = 0
-COL_DATE = 1
-COL_USER_TYPE = 2
-COL_PARTNER_ROLE = 3
-COL_NAME = 4
-COL_PHONE = 5
-COL_TELEGRAM = 6
-COL_CITY = 7
-COL_PROP_TYPE = 8
-COL_AREA = 9
-COL_STAGE = 10
-COL_PROJECT = 11
-COL_BUDGET = 12
-COL_COMMENT = 13
-COL_PARTNERSHIP_TERMS = 14
-COL_STATUS = 15
-COL_AMOUNT = 16
-COL_TG_ID = 17
-
 
 
 def get_service():
-    if not config.google_sheets.spreadsheet_id:
-        logging.error("Google Sheets not configured.")
-        return None
-    
-    try:
-        # Проверяем переменную окружения
-        service_account_json = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
-        
-        if service_account_json:
-            # Парсинг JSON из переменной окружения
-            service_account_info = json.loads(service_account_json)
-            creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
-        elif config.google_sheets.service_account_file and os.path.exists(config.google_sheets.service_account_file):
-            # Используем файл учетных данных
-            creds = Credentials.from_service_account_file(
-                config.google_sheets.service_account_file, scopes=SCOPES
-            )
-        else:
-            # Если учетные данные не настроены, возвращаем None вместо использования демо данных
-            logging.warning("Google Sheets credentials not configured. Skipping Google Sheets integration.")
+    """Return the shared worksheet handle (authorized once per process)."""
+    return sheet_manager.get_sheet()
+
+async def get_async_service():
+    """
+    Async facade over the shared worksheet. Connecting (first call only)
+    and every gspread call run in the Sheets executor, off the event loop.
+    """
+    sheet = sheet_manager.sheet
+    if sheet is None:
+        try:
+            sheet = await sheets_executor.run(get_service)
+        except CircuitOpenError:
             return None
-        
-        client = gspread.authorize(creds)
-        sheet = client.open_by_key(config.google_sheets.spreadsheet_id).sheet1
-        
-        # Ensure headers are set on initialization
-        ensure_headers(sheet)
-        return sheet
-    except Exception as e:
-        logging.error(f"Error connecting to Google Sheets: {e}")
+    if sheet is None:
         return None
+    return AsyncWorksheet(sheet, sheets_executor)
+
+async def _probe_sheets():
+    """Recovery probe for the circuit breaker: one small read."""
+    with lane(Lane.MAINTENANCE):
+        sheet = sheet_manager.sheet or await sheets_executor.run(get_service, probe=True)
+        if sheet is None:
+            raise RuntimeError("Google Sheets service not available")
+        await sheets_executor.run(sheet.row_values, 1, probe=True)
+
+def data_is_stale() -> bool:
+    """
+    True while reads are answered from the last known data because
+    Google Sheets is failing; handlers show a "may be stale" note.
+    """
+    return sheets_breaker.state != CLOSED or _index_load_failed
 
 def ensure_headers(sheet):
     """Ensure headers are correctly set with proper formatting"""
@@ -103,6 +93,137 @@ def ensure_headers(sheet):
     else:
         logging.info("Headers already match specification")
 
+sheet_manager = SheetClientManager(on_connect=ensure_headers)
+metrics.register("sheets_client", sheet_manager.stats)
+metrics.register("sheets_executor", sheets_executor.stats)
+metrics.register("sheets_quota", quota_governor.stats)
+metrics.register("sheets_breaker", sheets_breaker.stats)
+sheets_breaker.probe = _probe_sheets
+# Reads served from last known data during the outage reload on recovery
+sheets_breaker.on_close = request_index.invalidate
+metrics.register("request_index", request_index.stats)
+metrics.register("id_allocator", id_allocator.stats)
+
+# Local copy of the sheet: the bot reads and writes here, the sheet is synced
+mirror = RequestMirror(len(HEADERS))
+metrics.register("mirror", mirror.stats)
+
+# Serializes full index loads so concurrent handlers share one sheet read
+_index_lock = asyncio.Lock()
+# Set after the first index load in this process
+_index_warm = False
+# time.monotonic() of the last full sheet read; None until the first one
+_last_pull = None
+# Set while the index is served from the last known rows because loading it failed
+_index_load_failed = False
+# Set once the ID sequence was reconciled with the sheet's rows (pulled or mirrored)
+_ids_reconciled = False
+
+# "My Requests" lists per identifier, dropped when one of their rows changes
+user_requests_cache = UserRequestsCache(
+    ttl=config.google_sheets.user_cache_ttl,
+    max_size=config.google_sheets.user_cache_size,
+)
+metrics.register("user_requests_cache", user_requests_cache.stats)
+
+def _build_index(all_values: list, previous_rows: list):
+    """
+    Worker-thread half of load_index: a new index, the ID sequence kept
+    ahead of it, and the rows that were added, changed or removed
+    (None when there was no previous snapshot).
+    """
+    index = RequestIndex()
+    index.load(all_values)
+    id_allocator.reconcile(index.max_id)
+    if not previous_rows:
+        return index, None
+
+    previous = {_get_col(row, COL_ID).strip(): row for row in previous_rows}
+    changed = []
+    for row in index.rows:
+        before = previous.pop(_get_col(row, COL_ID).strip(), None)
+        if before != row:
+            changed.append(row)
+            if before is not None:
+                changed.append(before)
+    # Whatever is left was removed from the sheet
+    changed.extend(previous.values())
+    return index, changed
+
+async def load_index(all_values: list):
+    """
+    Reload the request index and keep the ID sequence ahead of the sheet.
+    The index and the diff are built in a worker thread and swapped in here;
+    index changes made since request_index.start_rebuild(), called before
+    all_values was read, are carried over. Cached request lists are dropped only for rows that were added,
+    changed or removed; rows that merely moved keep their lists valid.
+    """
+    index, changed = await asyncio.to_thread(_build_index, all_values, list(request_index.rows))
+    request_index.replace(index)
+    if changed is None:
+        user_requests_cache.clear()
+    elif changed:
+        _invalidate_cached(changed)
+
+def _invalidate_cached(rows: list):
+    """Drop cached request lists that could include any of these rows."""
+    user_requests_cache.invalidate_rows([
+        (_get_col(row, COL_TG_ID), _get_col(row, COL_PHONE), _get_col(row, COL_ID))
+        for row in rows
+    ])
+
+async def _load_index_from_mirror(sheet, pull: bool):
+    global _index_warm, _last_pull, _index_load_failed, _ids_reconciled
+    if pull:
+        if sheet is None:
+            raise RuntimeError("Google Sheets service not available")
+        await asyncio.to_thread(mirror.pull, await sheet.get_all_values())
+        _last_pull = time.monotonic()
+    request_index.start_rebuild()
+    try:
+        rows = await asyncio.to_thread(mirror.rows)
+        await load_index([HEADERS] + rows)
+    except BaseException:
+        request_index.cancel_rebuild()
+        raise
+    # An empty mirror that was not pulled says nothing about the sheet's IDs
+    _ids_reconciled = _ids_reconciled or pull or bool(rows)
+    _index_warm = True
+    _index_load_failed = False
+
+async def pull_sheet(sheet):
+    """Merge a full sheet read into the mirror and reload the index from it."""
+    async with _index_lock:
+        await _load_index_from_mirror(sheet, pull=True)
+
+async def ensure_index(sheet):
+    """
+    Load the request index from the local mirror. The first load after a
+    restart trusts the mirror as is (the poller catches up on changes made
+    meanwhile); after an invalidation the mirror pulls the sheet first,
+    since rows were added, moved or removed there.
+    If that read fails, the last known rows are served and the index stays
+    invalid, so the read is retried (failing fast while the breaker is open).
+    """
+    global _index_load_failed
+    if request_index.loaded:
+        return
+    async with _index_lock:
+        if request_index.loaded:
+            return
+        warm_start = not _index_warm and await asyncio.to_thread(mirror.count)
+        try:
+            await _load_index_from_mirror(sheet, pull=not warm_start)
+        except Exception as e:
+            if not request_index.rows:
+                await _load_index_from_mirror(sheet, pull=False)
+                request_index.invalidate()
+            if not request_index.rows:
+                raise
+            _index_load_failed = True
+            if not isinstance(e, CircuitOpenError):
+                logging.warning(f"Google Sheets read failed, serving last known data: {e}")
+
 def map_status_to_english(status):
     """Map Russian status to English equivalent"""
     status_map = dict(zip(STATUS_VALUES, ENGLISH_STATUS_VALUES))
@@ -113,288 +234,550 @@ def map_status_to_russian(status):
     status_map = dict(zip(ENGLISH_STATUS_VALUES, STATUS_VALUES))
     return status_map.get(status, status)
 
-async def append_request(request_type: str, data: dict, user_id: int):
+def build_request_row(request_type: str, data: dict, user_id: int, req_id: int, timestamp: str) -> list:
     """
-    Appends a new row to the Google Sheet with the new schema.
+    The sheet row (HEADERS order) for a completed client or partner form.
     """
-    sheet = get_service()
-    if not sheet:
-        return
-
-    try:
-        # Headers are ensured by get_service()
+    # Set default values
+    status = "Новая"  # Default status in Russian
+    amount = "-"  # Default amount
+    
+    # Common fields
+    name = data.get("name", "").strip()
+    phone = data.get("phone", "")
+    username = data.get("username", "")
+    telegram = f"@{username}" if username else ""
+    city = data.get("city", "")
+    prop_type = data.get("property_type", "")
+    area = data.get("area", "")
+    stage = data.get("stage", "")
+    comment = data.get("description", "") or data.get("comments", "")
+    partnership_terms = ""
+    
+    # Fields specific to partners
+    partner_role = "-"
+    project = ""
+    budget = "Неизвестно"  # Default budget value
+    
+    # Handle partner-specific data
+    if request_type == "Партнер":
+        partner_role = data.get('role', '-')
+        project = data.get('project_presence', '')
         
-        # Generate new ID by getting the current max ID and adding 1
-        all_values = sheet.get_all_values()
-        next_id = 1
-        if len(all_values) > 1:  # Header exists and there's at least one data row
-            max_id = 0
-            for row in all_values[1:]:  # Skip header row
-                if row and row[0].isdigit():
-                    row_id = int(row[0])
-                    if row_id > max_id:
-                        max_id = row_id
-            next_id = max_id + 1
-
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Add file attachment indicator if files exist
+        files_data = data.get("files", [])
+        if files_data:
+            project += " (файлы прикреплены)"
         
-        # Set default values
-        status = "Новая"  # Default status in Russian
-        amount = "-"  # Default amount
+        budget = data.get('budget', 'Неизвестно')
         
-        # Common fields
-        name = data.get("name", "").strip()
-        phone = data.get("phone", "")
-        username = data.get("username", "")
-        telegram = f"@{username}" if username else ""
-        city = data.get("city", "")
-        prop_type = data.get("property_type", "")
-        area = data.get("area", "")
-        stage = data.get("stage", "")
-        comment = data.get("description", "") or data.get("comments", "")
-        partnership_terms = ""
+        # Handle partnership terms according to requirements
+        terms_choice = data.get('terms_choice', '')
+        terms_custom = data.get('terms_custom', '')
         
-        # Fields specific to partners
+        if terms_choice == "Принимаю 10% кэшбэк":
+            partnership_terms = "кэшбэк 10% от стоимости работ."
+        elif terms_choice == "Хочу предложить свои условия" and terms_custom:
+            partnership_terms = terms_custom
+    else:
+        # For clients, set partner role to "-"
         partner_role = "-"
-        project = ""
-        budget = "Неизвестно"  # Default budget value
-        
-        # Handle partner-specific data
-        if request_type == "Партнер":
-            partner_role = data.get('role', '-')
-            project = data.get('project_presence', '')
-            
-            # Add file attachment indicator if files exist
-            files_data = data.get("files", [])
-            if files_data:
-                project += " (файлы прикреплены)"
-            
-            budget = data.get('budget', 'Неизвестно')
-            
-            # Handle partnership terms according to requirements
-            terms_choice = data.get('terms_choice', '')
-            terms_custom = data.get('terms_custom', '')
-            
-            if terms_choice == "Принимаю 10% кэшбэк":
-                partnership_terms = "кэшбэк 10% от стоимости работ."
-            elif terms_choice == "Хочу предложить свои условия" and terms_custom:
-                partnership_terms = terms_custom
-        else:
-            # For clients, set partner role to "-"
-            partner_role = "-"
-
-        # Map request type to Russian
-        user_type = "Заказчик" if request_type == "Client" else "Партнер"
-
-        # Create row with all required fields in correct order
-        row_data = {
-            "ID заявки": str(next_id),
-            "Дата/время": timestamp,
-            "Тип пользователя": user_type,
-            "Роль партнёра": partner_role,
-            "Имя": name,
-            "Телефон": phone,
-            "Telegram @": telegram,
-            "Город / район": city,
-            "Тип объекта": prop_type,
-            "Площадь (м²)": str(area),
-            "Стадия ремонта/объекта": stage,
-            "Наличие проекта": project,
-            "Примерный бюджет по электрике": budget,
-            "Комментарий": comment,
-            "Условия партнёрства": partnership_terms,
-            "Статус заявки": status,
-            "Сумма": amount,
-            "ID пользователя/чата в Telegram": str(user_id)
-        }
-        
-        # Convert to row in correct header order
-        row = [row_data.get(header, "") for header in HEADERS]
 
-        # Insert with proper ordering: Clients first, then Partners
-        insert_index = determine_insert_position(sheet, user_type)
-        sheet.insert_row(row, insert_index)
-        return next_id
-        
+    # Map request type to Russian
+    user_type = "Заказчик" if request_type == "Client" else "Партнер"
+
+    # Create row with all required fields in correct order
+    row_data = {
+        "ID заявки": str(req_id),
+        "Дата/время": timestamp,
+        "Тип пользователя": user_type,
+        "Роль партнёра": partner_role,
+        "Имя": name,
+        "Телефон": phone,
+        "Telegram @": telegram,
+        "Город / район": city,
+        "Тип объекта": prop_type,
+        "Площадь (м²)": str(area),
+        "Стадия ремонта/объекта": stage,
+        "Наличие проекта": project,
+        "Примерный бюджет по электрике": budget,
+        "Комментарий": comment,
+        "Условия партнёрства": partnership_terms,
+        "Статус заявки": status,
+        "Сумма": amount,
+        "ID пользователя/чата в Telegram": str(user_id)
+    }
+    
+    # Convert to row in correct header order
+    return [row_data.get(header, "") for header in HEADERS]
+
+async def append_request(request_type: str, data: dict, user_id: int):
+    """
+    Accept a completed form: the submission is written to the local
+    write-ahead journal (fsync'd) and the call returns its request ID,
+    or None if it could not be stored (the caller must not acknowledge it).
+    The journal replayer adds it to the local mirror, from where the write
+    queue appends it to the sheet. Only the first call after a start with
+    an empty DATA_DIR waits for Google Sheets, to reconcile the ID sequence.
+    """
+    if not _ids_reconciled:
+        # A fresh DATA_DIR starts the sequence at 0: line it up with the
+        # sheet before the first ID is handed out
+        try:
+            await ensure_index(await get_async_service())
+        except Exception as e:
+            logging.warning(f"Request IDs not reconciled with the sheet yet: {e}")
+    try:
+        # O(1) ID from the persisted sequence, allocated up front so a
+        # replayed record always describes the same request
+        req_id = await asyncio.to_thread(id_allocator.allocate)
+        await request_journal.append({
+            "req_id": req_id,
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "type": request_type,
+            "user_id": user_id,
+            "data": data,
+        })
+        return req_id
     except Exception as e:
-        logging.error(f"Error saving to Google Sheets: {e}")
+        logging.error(f"Error journaling request: {e}")
         traceback.print_exc()
 
-def determine_insert_position(sheet, request_type: str) -> int:
+def _same_submission(row: list, record: dict) -> bool:
+    return row[COL_DATE] == record["timestamp"] and row[COL_TG_ID] == str(record["user_id"])
+
+async def _notify_renumbered(record: dict, req_id: str):
+    """Tell the author the ID their request was finally saved under."""
+    await outbox.enqueue(
+        "user_status", int(record["user_id"]),
+        {"text": f"Ваша заявка сохранена под номером #{req_id}."},
+        dedup_key=f"renumbered:{record['seq']}",
+    )
+
+async def _replay_request(record: dict):
     """
-    Determine the correct insertion position to maintain ordering:
-    Clients first, then Partners, sorted by Date/Time within each user type
+    Apply one journaled submission. Idempotent: a record replayed after a
+    crash finds its row already in the mirror and is skipped.
     """
-    all_values = sheet.get_all_values()
-    data_rows = all_values[1:] if len(all_values) > 1 else []
-    
-    # Default insertion point is at the end
-    insert_index = len(data_rows) + 2
-    
-    if request_type == "Заказчик":  # Client
-        # Insert among clients or at the beginning of the data section
-        insert_index = 2  # Start after header
-        for i, r in enumerate(data_rows, start=2):
-            # If we find a partner record, insert here
-            if len(r) > 2 and r[2] == "Партнер":
-                insert_index = i
-                break
-    # For Partners, they go after all clients, which is the default behavior
-    
-    logging.info(f"Determined insert position for {request_type}: {insert_index}")
-    return insert_index
+    req_id = str(record["req_id"])
+    existing = await asyncio.to_thread(mirror.get_row, req_id)
+    if existing and _same_submission(existing, record):
+        return
 
-async def get_requests_by_user(identifier: str):
+    # Reconciles the ID sequence with the sheet on the first load
+    await ensure_index(await get_async_service())
+    taken = existing or request_index.get(req_id)
+    if taken:
+        # The sequence was behind the sheet when the ID was allocated (first
+        # start with an existing sheet): look for an earlier replay under a
+        # new ID before allocating one
+        for row in await asyncio.to_thread(mirror.rows):
+            if _same_submission(row, record):
+                # Replayed again after a crash; the notification is deduplicated
+                await _notify_renumbered(record, row[COL_ID])
+                return
+        new_id = await asyncio.to_thread(id_allocator.allocate)
+        logging.warning(f"Request ID {req_id} already taken in the sheet, saved as {new_id}")
+        req_id = str(new_id)
+
+    row = build_request_row(record["type"], record["data"], record["user_id"], req_id, record["timestamp"])
+    # Stored locally first, so the request is readable right away and
+    # survives a restart; the sheet write is batched with other submissions
+    await asyncio.to_thread(mirror.insert_local, row)
+    request_index.append(row)
+    _invalidate_cached([row])
+    write_queue.submit(row)
+    if taken:
+        await _notify_renumbered(record, req_id)
+
+request_journal = Journal("requests.jsonl", _replay_request)
+metrics.register("request_journal", request_journal.stats)
+
+# Set when an append failed without telling whether the rows were written
+_append_uncertain = False
+
+async def _write_rows(rows: list) -> list:
     """
-    Search requests where identifier matches Phone or TG ID.
-    identifier: Can be phone (string) or user_id (string/int)
+    Write a batch of new rows at the end of the sheet in one values-append.
+    Returns their request IDs in order. After a failed append, rows that
+    reached the sheet anyway are not written again.
     """
-    sheet = get_service()
+    global _append_uncertain
+    sheet = await get_async_service()
     if not sheet:
+        raise RuntimeError("Google Sheets service not available")
+
+    ids = [int(row[COL_ID]) for row in rows]
+    if _append_uncertain:
+        # The last append failed but may still have landed (e.g. it timed
+        # out while the request went through): a pull marks the rows found
+        # in the sheet as inserted, and only the others are appended
+        with lane(Lane.WRITES):
+            await pull_sheet(sheet)
+        _append_uncertain = False
+
+    # Queued rows are copies taken at submit time; send the mirror's current
+    # values so edits made meanwhile (e.g. a status change) are not lost
+    pending = {row[COL_ID]: row for row in await asyncio.to_thread(mirror.pending_inserts)}
+    landed = len(rows) - sum(row[COL_ID] in pending for row in rows)
+    if landed:
+        logging.warning(f"{landed} queued rows were already in the sheet, not re-sent")
+    rows = [pending[row[COL_ID]] for row in rows if row[COL_ID] in pending]
+    if not rows:
+        return ids
+
+    try:
+        with lane(Lane.WRITES):
+            response = await sheet.append_rows(rows, table_range="A1")
+    except CircuitOpenError:
+        raise
+    except Exception:
+        _append_uncertain = True
+        raise
+    # e.g. "'Заявки'!A12:R14"
+    updated = response["updates"]["updatedRange"]
+    first_row = gspread.utils.a1_to_rowcol(updated.split("!")[-1].split(":")[0])[0]
+    written = [(first_row + i, row) for i, row in enumerate(rows)]
+    await asyncio.to_thread(mirror.mark_inserted, written)
+
+    # The index placed these rows at the end when they were submitted;
+    # rows added to the sheet by hand meanwhile shift them
+    for row_idx, row in written:
+        found = request_index.get(row[COL_ID])
+        if found and found[0] != row_idx:
+            request_index.invalidate()
+            break
+
+    # Partners appended at the end are already in place; a client row
+    # after the partners needs the compaction job to move it up
+    global _needs_compaction
+    if any(row[COL_USER_TYPE] == "Заказчик" for row in rows):
+        _needs_compaction = True
+    return ids
+
+async def _restore_rows() -> list:
+    """Requests accepted before a restart but not yet in the sheet."""
+    if not await asyncio.to_thread(mirror.pending_inserts):
         return []
+    sheet = await get_async_service()
+    if not sheet:
+        raise RuntimeError("Google Sheets service not available")
+    # Rows written just before a crash are found by the pull and not re-sent
+    with lane(Lane.WRITES):
+        await pull_sheet(sheet)
+    return await asyncio.to_thread(mirror.pending_inserts)
+
+write_queue = WriteBehindQueue(
+    _write_rows,
+    flush_interval_ms=config.google_sheets.flush_interval_ms,
+    max_rows=config.google_sheets.flush_max_rows,
+    restore=_restore_rows,
+)
+metrics.register("write_queue", write_queue.stats)
 
+# Set when appended rows broke the "clients first, then partners, by date" layout
+_needs_compaction = False
+compactions = 0
+metrics.register("compaction", lambda: {"pending": _needs_compaction, "runs": compactions})
+
+async def compact_sheet() -> bool:
+    """
+    Restore the layout: Clients first, then Partners, sorted by Date/Time
+    within each user type. One sortRange request over the data range
+    ("Заказчик" sorts before "Партнер").
+    """
+    global _needs_compaction, compactions
+    if not _needs_compaction:
+        return False
+
+    sheet = await get_async_service()
+    if not sheet:
+        return False
+
+    body = {
+        "requests": [{
+            "sortRange": {
+                "range": {
+                    "sheetId": sheet.id,
+                    "startRowIndex": 1,  # Skip header row
+                    "startColumnIndex": 0,
+                    "endColumnIndex": len(HEADERS),
+                },
+                "sortSpecs": [
+                    {"dimensionIndex": COL_USER_TYPE, "sortOrder": "ASCENDING"},
+                    {"dimensionIndex": COL_DATE, "sortOrder": "ASCENDING"},
+                ],
+            }
+        }]
+    }
+    async with write_queue.lock:
+        await sheets_executor.run(sheet.spreadsheet.batch_update, body)
+        _needs_compaction = False
+        compactions += 1
+        # Row numbers changed: reload on next use
+        request_index.invalidate()
+    logging.info("Sheet re-sorted: clients first, then partners")
+    return True
+
+async def run_compactor():
+    """Background task: periodically re-sort the sheet if new rows broke the layout."""
+    set_lane(Lane.MAINTENANCE)
+    while True:
+        await asyncio.sleep(config.google_sheets.compact_interval)
+        try:
+            await compact_sheet()
+        except Exception as e:
+            logging.error(f"Error compacting Google Sheet: {e}")
+
+def _get_col(row, i):
+    return row[i] if i < len(row) else ""
+
+def _id_key(req_id: str) -> int:
+    return int(req_id) if req_id.isdigit() else 0
+
+def _request_summary(req_id: str):
+    found = request_index.get(req_id)
+    if not found:
+        return None
+    row_idx, row = found
+    return {
+        "id": _get_col(row, COL_ID).strip(),
+        "date": _get_col(row, COL_DATE),
+        "status": _get_col(row, COL_STATUS),
+        "amount": _get_col(row, COL_AMOUNT),
+        "type": _get_col(row, COL_USER_TYPE),
+        "description": _get_col(row, COL_COMMENT),
+        "files": _get_col(row, COL_PROJECT),  # Using project column for files info
+        "row_idx": row_idx
+    }
+
+async def _user_request_ids(identifier: str) -> list:
+    """
+    IDs of the user's requests, newest first (per-user cache, refreshed from the index).
+    While the index needs a reload, a cached list is served as stale rather
+    than waiting for the full sheet read.
+    """
+    return await user_requests_cache.get(
+        identifier, _find_request_ids_by_user, stale=not request_index.loaded
+    )
+
+async def _reload_index_for_cache():
+    # A reload invalidates the cached lists whose rows changed
+    await ensure_index(await get_async_service())
+
+user_requests_cache.prepare = _reload_index_for_cache
+
+async def _find_request_ids_by_user(identifier: str) -> list:
+    # The cache reloads the index first (_reload_index_for_cache)
+    ids = [_get_col(row, COL_ID).strip() for _, row in request_index.find_by_user(identifier)]
+    return sorted(ids, key=_id_key, reverse=True)
+
+async def get_requests_by_user(identifier: str):
+    """
+    Search requests where identifier matches Phone, TG ID or Request ID.
+    identifier: Can be phone (string) or user_id (string/int)
+    Newest first; served from the per-user cache and the request index.
+    """
     try:
-        all_values = sheet.get_all_values()
-        if not all_values:
-            return []
-            
-        header = all_values[0]
-        data_rows = all_values[1:]
-        
-        results = []
-        clean_ident = str(identifier).replace(" ", "").replace("+", "").strip()
-
-        for idx, row in enumerate(data_rows):
-            # Safe get
-            def get_col(i): return row[i] if i < len(row) else ""
-            
-            r_phone = get_col(COL_PHONE).replace(" ", "").replace("+", "").strip()
-            r_tg_id = get_col(COL_TG_ID).strip()
-            r_id = get_col(COL_ID).strip()
-            
-            # Check match (Creator)
-            # Match if:
-            # 1. Identifier matches Phone (cleaned)
-            # 2. Identifier matches TG ID
-            # 3. Identifier matches Request ID (exact match)
-            
-            is_match = False
-            if clean_ident:
-                 if clean_ident in r_phone: is_match = True
-                 elif clean_ident == r_tg_id: is_match = True
-                 elif clean_ident == r_id: is_match = True
-            
-            if is_match:
-                results.append({
-                    "id": r_id,
-                    "date": get_col(COL_DATE),
-                    "status": get_col(COL_STATUS),
-                    "amount": get_col(COL_AMOUNT),
-                    "type": get_col(COL_USER_TYPE),
-                    "description": get_col(COL_COMMENT),
-                    "files": get_col(COL_PROJECT),  # Using project column for files info
-                    "row_idx": idx + 2 # 1-based, +1 for header
-                })
-        
-        return results
+        ids = await _user_request_ids(identifier)
+        return [r for r in map(_request_summary, ids) if r]
 
     except Exception as e:
         logging.error(f"Error reading Google Sheets: {e}")
         return []
 
-async def get_all_requests_status():
+async def get_requests_page(identifier: str, cursor: str = None, forward: bool = True, limit: int = 5):
+    """
+    One page of a user's requests, newest first. cursor is a request ID
+    from a previous page: forward=True returns the requests older than it,
+    forward=False the ones newer than it. Only the page's rows are built.
+
+    Returns {"requests": [...], "prev": cursor or None, "next": cursor or None,
+    "total": int}; prev/next are None on the first/last page.
+    """
+    try:
+        ids = await _user_request_ids(identifier)
+    except Exception as e:
+        logging.error(f"Error reading Google Sheets: {e}")
+        return {"requests": [], "prev": None, "next": None, "total": 0}
+
+    # ids are sorted by descending ID; negated keys are ascending for bisect
+    keys = [-_id_key(req_id) for req_id in ids]
+    if cursor is None:
+        start = 0
+    elif forward:
+        start = bisect.bisect_right(keys, -_id_key(cursor))
+    else:
+        start = max(0, bisect.bisect_left(keys, -_id_key(cursor)) - limit)
+    page_ids = ids[start:start + limit]
+    end = start + len(page_ids)
+
+    return {
+        "requests": [r for r in map(_request_summary, page_ids) if r],
+        "prev": page_ids[0] if start > 0 and page_ids else None,
+        "next": page_ids[-1] if end < len(ids) and page_ids else None,
+        "total": len(ids),
+    }
+
+# Columns read by the status poller, as (range, first column) pairs
+POLL_RANGES = [("A2:A", COL_ID), ("N2:N", COL_COMMENT), ("P2:R", COL_STATUS)]
+
+def row_fingerprint(status: str, amount: str, comment: str, tg_id: str) -> int:
+    """Compact, process-independent fingerprint of the polled columns."""
+    return zlib.crc32("\x1f".join((status, amount, comment, tg_id)).encode("utf-8"))
+
+def _polled_columns(ranges: list) -> dict:
+    """{column index: list of values by data row} from the POLL_RANGES read."""
+    columns = {}
+    for (_, first_col), values in zip(POLL_RANGES, ranges):
+        width = max((len(v) for v in values), default=0)
+        for offset in range(width):
+            columns[first_col + offset] = [v[offset] if offset < len(v) else "" for v in values]
+    return columns
+
+async def read_polled_columns() -> dict:
     """
-    Returns a dict {request_id: {'status': status, 'amount': amount, 'row_data': row}}
-    Used for polling.
+    Read only the polled columns in one batched ranged read.
+    Returns {column index: list of values by data row}, or {} if the read failed.
     """
-    sheet = get_service()
+    sheet = await get_async_service()
     if not sheet:
         return {}
 
     try:
-        all_values = sheet.get_all_values()
-        if len(all_values) < 2:
-            return {}
-            
-        data_rows = all_values[1:]
-        result = {}
-        
-        for row in data_rows:
-            if not row: continue
-            
-            def get_col(i): return row[i] if i < len(row) else ""
-            
-            r_id = get_col(COL_ID)
-            if not r_id: continue
-            
-            result[r_id] = {
-                "status": get_col(COL_STATUS),
-                "amount": get_col(COL_AMOUNT),
-                "tg_id": get_col(COL_TG_ID),
-                "desc": get_col(COL_COMMENT),
-                "date": get_col(COL_DATE),
-                "type": get_col(COL_USER_TYPE),
-                "name": get_col(COL_NAME),
-                "id": r_id
-            }
-            
-        return result
-        
+        ranges = await sheet.batch_get([r for r, _ in POLL_RANGES])
+        return await asyncio.to_thread(_polled_columns, ranges)
     except Exception as e:
         logging.error(f"Error fetching all requests: {e}")
         return {}
 
-async def get_request_by_id(req_id: str):
+def polled_fingerprints(columns: dict) -> dict:
+    """
+    {request_id: (fingerprint, data row offset)} for the polled columns.
+    CPU-bound on big sheets: run it in a worker thread.
     """
-    Fetch a single request by its ID.
+    ids = columns.get(COL_ID, [])
+
+    def column(col):
+        # Trailing empty cells are not returned, so columns can be shorter
+        values = columns.get(col, [])
+        return values + [""] * (len(ids) - len(values))
+
+    result = {}
+    polled = zip(ids, column(COL_STATUS), column(COL_AMOUNT), column(COL_COMMENT), column(COL_TG_ID))
+    for i, (r_id, status, amount, comment, tg_id) in enumerate(polled):
+        r_id = r_id.strip()
+        if r_id:
+            result[r_id] = (row_fingerprint(status, amount, comment, tg_id), i)
+    return result
+
+def polled_row(columns: dict, i: int, fp: int) -> dict:
+    """Data row `i` of the polled columns: {'status', 'amount', 'comment', 'tg_id', 'row_idx', 'fp'}."""
+    return {
+        "status": _get_col(columns.get(COL_STATUS, []), i),
+        "amount": _get_col(columns.get(COL_AMOUNT, []), i),
+        "comment": _get_col(columns.get(COL_COMMENT, []), i),
+        "tg_id": _get_col(columns.get(COL_TG_ID, []), i),
+        "row_idx": i + 2,
+        "fp": fp,
+    }
+
+async def fetch_revision():
     """
-    sheet = get_service()
+    Spreadsheet revision from Drive metadata (one small request).
+    Changes on every edit, so the poller can skip reads when it is unchanged.
+    """
+    sheet = await get_async_service()
     if not sheet:
-        logging.warning("Google Sheets service not available")
         return None
 
+    def fetch():
+        response = sheet_manager.client.http_client.request(
+            "get",
+            f"{DRIVE_FILES_API_V3_URL}/{config.google_sheets.spreadsheet_id}",
+            params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+        )
+        meta = response.json()
+        return meta.get("version") or meta.get("modifiedTime")
+
+    return await sheets_executor.run(fetch)
+
+async def apply_polled_changes(changed: dict, removed_ids=()):
+    """
+    Merge the poller's diff into the mirror and the request index instead of
+    re-reading the whole sheet. Rows the index does not know (added or
+    moved by hand) or removed rows force a full pull on next use.
+    """
+    if not request_index.loaded:
+        return
+    if removed_ids:
+        request_index.invalidate()
+        return
+
+    for req_id, data in changed.items():
+        pos = request_index.by_id.get(req_id)
+        if pos is None or pos + 2 != data["row_idx"]:
+            request_index.invalidate()
+            return
+
+    # Conflicts with unsynced local edits are resolved per cell by the mirror
+    resolved = await asyncio.to_thread(mirror.merge_remote, {
+        req_id: {
+            COL_STATUS: data["status"],
+            COL_AMOUNT: data["amount"],
+            COL_COMMENT: data["comment"],
+            COL_TG_ID: data["tg_id"],
+        }
+        for req_id, data in changed.items()
+    })
+    for req_id, row in resolved.items():
+        if row is None:
+            request_index.invalidate()
+            return
+        # Both the old and the new Telegram ID may list this request
+        _invalidate_cached([request_index.get(req_id)[1], row])
+        request_index.update_cells(req_id, {
+            col: row[col] for col in (COL_STATUS, COL_AMOUNT, COL_COMMENT, COL_TG_ID)
+        })
+
+async def get_request_by_id(req_id: str):
+    """
+    Fetch a single request by its ID from the request index.
+    """
+    sheet = await get_async_service()
+
     try:
-        logging.info(f"Fetching request by ID: {req_id}")
-        all_values = sheet.get_all_values()
-        logging.info(f"Retrieved {len(all_values)} rows from Google Sheets")
-        
-        if len(all_values) < 2:
-            logging.info("No data rows found in Google Sheets")
+        await ensure_index(sheet)
+        found = request_index.get(req_id)
+        if not found:
+            logging.info(f"Request with ID {req_id} not found")
             return None
-            
-        data_rows = all_values[1:]
-        
-        for row in data_rows:
-            def get_col(i): return row[i] if i < len(row) else ""
-            
-            if get_col(COL_ID) == str(req_id):
-                result = {
-                    "id": get_col(COL_ID),
-                    "date": get_col(COL_DATE),
-                    "status": get_col(COL_STATUS),
-                    "amount": get_col(COL_AMOUNT),
-                    "type": get_col(COL_USER_TYPE),
-                    "desc": get_col(COL_COMMENT),
-                    "files": get_col(COL_PROJECT),
-                    "name": get_col(COL_NAME), 
-                    "phone": get_col(COL_PHONE),
-                    "partner_role": get_col(COL_PARTNER_ROLE),
-                    "city": get_col(COL_CITY),
-                    "prop_type": get_col(COL_PROP_TYPE),
-                    "area": get_col(COL_AREA),
-                    "stage": get_col(COL_STAGE),
-                    "project": get_col(COL_PROJECT),
-                    "budget": get_col(COL_BUDGET),
-                    "partnership_terms": get_col(COL_PARTNERSHIP_TERMS),
-                    "telegram": get_col(COL_TELEGRAM),
-                    "tg_id": get_col(COL_TG_ID)
-                }
-                logging.info(f"Found request with ID: {req_id}")
-                return result
-                
-        logging.info(f"Request with ID {req_id} not found")
-        return None
-        
+
+        _, row = found
+        def get_col(i): return _get_col(row, i)
+
+        return {
+            "id": get_col(COL_ID),
+            "date": get_col(COL_DATE),
+            "status": get_col(COL_STATUS),
+            "amount": get_col(COL_AMOUNT),
+            "type": get_col(COL_USER_TYPE),
+            "desc": get_col(COL_COMMENT),
+            "files": get_col(COL_PROJECT),
+            "name": get_col(COL_NAME),
+            "phone": get_col(COL_PHONE),
+            "partner_role": get_col(COL_PARTNER_ROLE),
+            "city": get_col(COL_CITY),
+            "prop_type": get_col(COL_PROP_TYPE),
+            "area": get_col(COL_AREA),
+            "stage": get_col(COL_STAGE),
+            "project": get_col(COL_PROJECT),
+            "budget": get_col(COL_BUDGET),
+            "partnership_terms": get_col(COL_PARTNERSHIP_TERMS),
+            "telegram": get_col(COL_TELEGRAM),
+            "tg_id": get_col(COL_TG_ID)
+        }
+
     except Exception as e:
         logging.error(f"Error fetching request by ID {req_id}: {e}")
         return None
@@ -403,42 +786,146 @@ async def update_request_status(req_id: str, new_status: str, comment: str = Non
     """
     Update the status of a request in Google Sheets.
     """
-    sheet = get_service()
-    if not sheet:
-        logging.warning("Google Sheets service not available")
-        return False
+    logging.info(f"Updating request {req_id} status to: {new_status}")
+    result = (await update_requests([(req_id, new_status, comment)])).get(str(req_id))
+    return result in ("updated", "queued")
+
+async def update_requests(changes) -> dict:
+    """
+    Bulk update: changes is an iterable of (request_id, status, comment, amount)
+    tuples; comment and amount are optional and None leaves a cell as is.
+    All changes are stored locally in one transaction and written to the
+    sheet in a single batch update. Rows are found through the index, no scan.
 
+    Returns {request_id: result} where result is "updated" (written to the
+    sheet), "queued" (stored, the sync loop or the row's pending append
+    writes it), "not_found" (also when the row was deleted from the sheet
+    before the edit reached it) or "error".
+    """
+    updates = {}
+    for change in changes:
+        req_id, status, comment, amount = (tuple(change) + (None, None))[:4]
+        values = {}
+        if status is not None:
+            values[COL_STATUS] = status
+        if comment is not None:
+            values[COL_COMMENT] = comment
+        if amount is not None:
+            values[COL_AMOUNT] = str(amount)
+        updates.setdefault(str(req_id).strip(), {}).update(values)
+    if not updates:
+        return {}
+
+    sheet = await get_async_service()
     try:
-        logging.info(f"Updating request {req_id} status to: {new_status}")
-        all_values = sheet.get_all_values()
-        
-        if len(all_values) < 2:
-            logging.info("No data rows found in Google Sheets")
-            return False
-            
-        data_rows = all_values[1:]
-        
-        # Find the row with the matching request ID
-        for i, row in enumerate(data_rows):
-            def get_col(j): return row[j] if j < len(row) else ""
-            
-            if get_col(COL_ID) == str(req_id):
-                # Update the status column
-                row_index = i + 2  # 1-based + header row
-                status_cell = gspread.utils.rowcol_to_a1(row_index, COL_STATUS + 1)  # +1 for 1-based indexing
-                sheet.update_acell(status_cell, new_status)
-                
-                # If comment is provided, update the comment column as well
-                if comment is not None:
-                    comment_cell = gspread.utils.rowcol_to_a1(row_index, COL_COMMENT + 1)
-                    sheet.update_acell(comment_cell, comment)
-                
-                logging.info(f"Updated request {req_id} status to: {new_status}")
-                return True
-                
-        logging.info(f"Request with ID {req_id} not found")
-        return False
-        
+        await ensure_index(sheet)
+        updated = await asyncio.to_thread(mirror.update_local, updates)
     except Exception as e:
-        logging.error(f"Error updating request {req_id} status: {e}")
-        return False
+        logging.error(f"Error updating requests {', '.join(updates)}: {e}")
+        return dict.fromkeys(updates, "error")
+
+    results = {}
+    for req_id, values in updates.items():
+        if req_id not in updated:
+            logging.info(f"Request with ID {req_id} not found")
+            results[req_id] = "not_found"
+            continue
+        # Recorded even while the index is being rebuilt, and re-applied then
+        request_index.update_cells(req_id, values)
+        found = request_index.get(req_id)
+        if found:
+            _invalidate_cached([found[1]])
+        else:
+            # The index lags behind the mirror: reload it on next use
+            request_index.invalidate()
+
+    # Push right away; if the sheet is unreachable the sync loop retries
+    if sheet is not None:
+        try:
+            await push_changes()
+        except Exception as e:
+            logging.error(f"Error pushing request updates to Google Sheets: {e}")
+
+    # Re-checked under the lock: the push (or a concurrent one) may have
+    # pulled the sheet and dropped rows deleted there by hand
+    async with write_queue.lock:
+        states = await asyncio.to_thread(mirror.sync_states, updated)
+    for req_id, state in states.items():
+        if state is None:
+            logging.info(f"Request with ID {req_id} was removed from the sheet")
+            results[req_id] = "not_found"
+        else:
+            # A row not appended yet gets the edit with its append
+            results[req_id] = "updated" if state == "synced" else "queued"
+    logging.info(f"Updated {sum(r == 'updated' for r in results.values())} of {len(updates)} requests")
+    return results
+
+async def push_changes() -> int:
+    """
+    Write all unsynced local edits to the sheet in one batch update.
+    Row numbers are checked against the live ID cells first, so rows moved
+    by hand are never overwritten. Returns the number of cells written.
+    """
+    sheet = await get_async_service()
+    if not sheet:
+        return 0
+
+    # Row numbers must not change (append, re-sort) between check and write
+    async with write_queue.lock:
+        dirty = await asyncio.to_thread(mirror.dirty_rows)
+        if not dirty:
+            return 0
+
+        id_cells = [gspread.utils.rowcol_to_a1(row_idx, COL_ID + 1) for _, row_idx, _ in dirty]
+        live = await sheet.batch_get(id_cells)
+        if any(
+            not values or values[0][0].strip() != req_id
+            for (req_id, _, _), values in zip(dirty, live)
+        ):
+            # Rows were moved by hand: pull the current layout from the sheet
+            request_index.invalidate()
+            await pull_sheet(sheet)
+            dirty = await asyncio.to_thread(mirror.dirty_rows)
+
+        data = [
+            {"range": gspread.utils.rowcol_to_a1(row_idx, col + 1), "values": [[value]]}
+            for _, row_idx, values in dirty
+            for col, value in values.items()
+        ]
+        if not data:
+            return 0
+        await sheet.batch_update(data, raw=False)
+        await asyncio.to_thread(mirror.mark_synced, [(req_id, values) for req_id, _, values in dirty])
+
+    logging.info(f"Pushed {len(data)} cells to Google Sheets")
+    return len(data)
+
+async def pull_if_due():
+    """
+    Full pull when none happened for full_pull_interval (or yet, after a warm
+    start). The poller only reads status, amount, comment and TG ID; this
+    picks up admin edits to the other columns it could not attribute.
+    """
+    if _last_pull is not None and time.monotonic() - _last_pull < config.google_sheets.full_pull_interval:
+        return
+    sheet = await get_async_service()
+    if not sheet:
+        return
+    with lane(Lane.MAINTENANCE):
+        await pull_sheet(sheet)
+
+async def run_sync():
+    """
+    Background task: push local edits that could not be written right away
+    and pull the whole sheet now and then.
+    """
+    set_lane(Lane.WRITES)
+    while True:
+        await asyncio.sleep(config.google_sheets.sync_interval)
+        try:
+            await push_changes()
+            await pull_if_due()
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            logging.error(f"Error syncing with Google Sheets: {e}")
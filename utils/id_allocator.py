@@ -0,0 +1,67 @@
+import logging
+import threading
+
+from utils import local_db
+
+
+class IdAllocator:
+    """
+    Monotonic request ID sequence persisted in SQLite.
+    Allocation is a single-row UPDATE inside an IMMEDIATE transaction, so
+    concurrent callers (threads or processes sharing DATA_DIR) never get the same ID.
+    """
+
+    def __init__(self, name: str = "requests"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._conn = None
+        self.allocated = 0
+        self.reconciled_to = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = local_db.connect()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sequences (name, value) VALUES (?, 0)", (self.name,)
+            )
+        return self._conn
+
+    def reconcile(self, max_id: int):
+        """Make sure the sequence is not behind the max ID present in the sheet."""
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "UPDATE sequences SET value = MAX(value, ?) WHERE name = ?", (max_id, self.name)
+            )
+            self.reconciled_to = max_id
+        logging.info(f"ID allocator reconciled with sheet max ID {max_id}")
+
+    def allocate(self) -> int:
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db, "BEGIN IMMEDIATE"):
+                db.execute("UPDATE sequences SET value = value + 1 WHERE name = ?", (self.name,))
+                value = db.execute(
+                    "SELECT value FROM sequences WHERE name = ?", (self.name,)
+                ).fetchone()[0]
+            self.allocated += 1
+            return value
+
+    def current(self) -> int:
+        with self._lock:
+            return self._db().execute(
+                "SELECT value FROM sequences WHERE name = ?", (self.name,)
+            ).fetchone()[0]
+
+    def stats(self) -> dict:
+        return {
+            "current": self.current(),
+            "allocated": self.allocated,
+            "reconciled_to": self.reconciled_to,
+        }
+
+
+id_allocator = IdAllocator()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from config import config
+from utils import local_db
+
+# Once everything is replayed, a journal bigger than this is truncated
+ROTATE_BYTES = 1024 * 1024
+# Delay before replaying a record again after a failure; doubles up to the max
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+
+
+class Journal:
+    """
+    Append-only JSONL write-ahead journal under DATA_DIR. append() returns
+    once the record is fsync'd, so it survives a crash; a background replayer
+    hands records to `apply` in order and stores the last applied sequence
+    number (the checkpoint) in SQLite. After a crash, records past the
+    checkpoint are applied again, so `apply` must be idempotent.
+    """
+
+    def __init__(self, name: str, apply):
+        # async apply(record); raises to retry
+        self._apply = apply
+        self.name = name
+        self.path = os.path.join(config.storage.data_dir, name)
+        self._lock = threading.Lock()
+        self._file = None
+        self._conn = None
+        self._seq = 0
+        # Records appended or found past the checkpoint, not yet applied
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        # The replayer task and stop() never apply the same record concurrently
+        self._replay_lock = asyncio.Lock()
+        self.checkpoint = 0
+        self.appended = 0
+        self.replayed = 0
+        self.failures = 0
+        self.rotations = 0
+        self._total_fsync = 0.0
+        self.max_fsync = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = local_db.connect()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+        return self._conn
+
+    def _open(self):
+        """Read the checkpoint and the records past it; drop a torn last line."""
+        row = self._db().execute(
+            "SELECT value FROM checkpoints WHERE name = ?", (self.name,)
+        ).fetchone()
+        self.checkpoint = self._seq = row[0] if row else 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        good_bytes = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Crashed mid-write: never fsync'd, so never acknowledged
+                        logging.warning(f"Dropping torn record at the end of {self.name}")
+                        break
+                    good_bytes += len(line)
+                    record = json.loads(line)
+                    self._seq = max(self._seq, record["seq"])
+                    if record["seq"] > self.checkpoint:
+                        self._pending.append(record)
+
+        self._file = open(self.path, "ab")
+        if self._file.tell() != good_bytes:
+            self._file.truncate(good_bytes)
+            os.fsync(self._file.fileno())
+        if self._pending:
+            logging.info(f"{len(self._pending)} records in {self.name} to replay after restart")
+
+    def _write(self, record: dict) -> dict:
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._seq += 1
+            record = {"seq": self._seq, **record}
+            started = time.monotonic()
+            self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            elapsed = time.monotonic() - started
+            # Queued under the lock so records are replayed in sequence order
+            self._pending.append(record)
+        self._total_fsync += elapsed
+        self.max_fsync = max(self.max_fsync, elapsed)
+        return record
+
+    async def append(self, record: dict) -> int:
+        """Durably store a record for replay. Returns its sequence number."""
+        record = await asyncio.to_thread(self._write, record)
+        self.appended += 1
+        self._wakeup.set()
+        return record["seq"]
+
+    def _advance(self, seq: int):
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO checkpoints (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (self.name, seq),
+            )
+            self.checkpoint = seq
+            # Everything applied: start the file over instead of growing forever.
+            # The sequence carries on from the checkpoint.
+            if seq == self._seq and self._file.tell() > ROTATE_BYTES:
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+                self.rotations += 1
+
+    async def replay(self) -> int:
+        """Apply pending records in order; stops at the first failure. Returns how many were applied."""
+        applied = 0
+        async with self._replay_lock:
+            while self._pending:
+                record = self._pending[0]
+                await self._apply(record)
+                await asyncio.to_thread(self._advance, record["seq"])
+                self._pending.pop(0)
+                self.replayed += 1
+                applied += 1
+        return applied
+
+    async def run(self):
+        """Background replayer task."""
+        await asyncio.to_thread(self._ensure_open)
+        delay = RETRY_BASE_DELAY
+        while True:
+            try:
+                await self.replay()
+                delay = RETRY_BASE_DELAY
+                self._wakeup.clear()
+                if not self._pending:
+                    await self._wakeup.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Error replaying {self.name}, retry in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def _ensure_open(self):
+        with self._lock:
+            if self._file is None:
+                self._open()
+
+    async def stop(self):
+        """Graceful shutdown: apply what we can; the rest is replayed on next start."""
+        await asyncio.to_thread(self._ensure_open)
+        try:
+            await self.replay()
+        except Exception as e:
+            logging.warning(f"{len(self._pending)} records in {self.name} not applied, will replay on start: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "seq": self._seq,
+            "checkpoint": self.checkpoint,
+            "lag": len(self._pending),
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "failures": self.failures,
+            "rotations": self.rotations,
+            "avg_fsync_ms": round(self._total_fsync / max(1, self.appended) * 1000, 2),
+            "max_fsync_ms": round(self.max_fsync * 1000, 2),
+        }
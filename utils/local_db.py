@@ -0,0 +1,69 @@
+import contextlib
+import logging
+import os
+import sqlite3
+
+from config import config
+
+DB_FILE = "state.db"
+# Filesystems whose contents are lost on a container restart or redeploy
+EPHEMERAL_FILESYSTEMS = {"overlay", "tmpfs", "ramfs", "aufs"}
+
+
+def connect(name: str = DB_FILE) -> sqlite3.Connection:
+    """
+    Open a SQLite database under DATA_DIR in WAL mode.
+    The connection may be shared between threads; callers serialize access.
+    """
+    os.makedirs(config.storage.data_dir, exist_ok=True)
+    conn = sqlite3.connect(
+        os.path.join(config.storage.data_dir, name),
+        check_same_thread=False,
+        isolation_level=None,  # explicit BEGIN/COMMIT
+        timeout=30,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(conn: sqlite3.Connection, begin: str = "BEGIN"):
+    """Run the block in one transaction: COMMIT on success, ROLLBACK on any error."""
+    conn.execute(begin)
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def data_dir_filesystem():
+    """Type of the filesystem DATA_DIR is on, from /proc/mounts; None if unknown."""
+    path = os.path.realpath(config.storage.data_dir)
+    mount_point, fstype = "", None
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                inside = path == mount or path.startswith(mount.rstrip("/") + "/")
+                if inside and len(mount) > len(mount_point):
+                    mount_point, fstype = mount, fields[2]
+    except OSError:
+        return None
+    return fstype
+
+
+def warn_if_ephemeral():
+    """Log a warning at startup if DATA_DIR looks like it won't survive a redeploy."""
+    fstype = data_dir_filesystem()
+    if fstype in EPHEMERAL_FILESYSTEMS:
+        logging.warning(
+            f"DATA_DIR ({config.storage.data_dir}) is on an ephemeral {fstype} filesystem: "
+            "the request journal, notification outbox, FSM state, ID sequence and sheet "
+            "mirror are lost on restart. Mount a persistent disk there."
+        )
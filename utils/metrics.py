@@ -0,0 +1,19 @@
+import logging
+
+# Registered metric sources: {name: callable returning a dict}
+_sources = {}
+
+def register(name: str, source):
+    """Register a component's stats() callable under a name."""
+    _sources[name] = source
+
+def collect() -> dict:
+    """Snapshot of all registered metrics."""
+    result = {}
+    for name, source in _sources.items():
+        try:
+            result[name] = source()
+        except Exception as e:
+            logging.error(f"Error collecting metrics from {name}: {e}")
+            result[name] = {"error": str(e)}
+    return result
@@ -0,0 +1,304 @@
+import json
+import logging
+import threading
+
+from utils import local_db
+from utils.columns import COL_AMOUNT, COL_STATUS
+
+# Conflicting edits to these columns are resolved in favour of the sheet:
+# admins own status and amount (Статус заявки, Сумма)
+SHEET_WINS_COLUMNS = {COL_STATUS, COL_AMOUNT}
+
+
+def _pad(row: list, width: int) -> list:
+    return list(row) + [""] * (width - len(row))
+
+
+class RequestMirror:
+    """
+    Local SQLite copy of the request sheet (HEADERS schema).
+    Each row keeps its current values, the last values known to be in the
+    sheet (base) and a bitmask of locally changed columns, so edits made on
+    both sides can be detected per cell.
+    Transactions read before they write, so they take the write lock up
+    front (BEGIN IMMEDIATE): in WAL mode a deferred one fails with "database
+    is locked" if another connection to the file committed meanwhile.
+    """
+
+    def __init__(self, width: int, db_name: str = "state.db"):
+        self.width = width
+        self._db_name = db_name
+        self._lock = threading.Lock()
+        self._conn = None
+        self.conflicts = 0
+        self.pulls = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = local_db.connect(self._db_name)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS requests ("
+                "req_id TEXT PRIMARY KEY, row_idx INTEGER, "
+                "vals TEXT NOT NULL, base TEXT NOT NULL, "
+                "dirty INTEGER NOT NULL DEFAULT 0, pending_insert INTEGER NOT NULL DEFAULT 0)"
+            )
+        return self._conn
+
+    def _get(self, db, req_id: str):
+        row = db.execute(
+            "SELECT row_idx, vals, base, dirty, pending_insert FROM requests WHERE req_id = ?",
+            (req_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        row_idx, vals, base, dirty, pending = row
+        return row_idx, json.loads(vals), json.loads(base), dirty, pending
+
+    def _put(self, db, req_id, row_idx, vals, base, dirty, pending):
+        db.execute(
+            "INSERT OR REPLACE INTO requests (req_id, row_idx, vals, base, dirty, pending_insert) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (req_id, row_idx, json.dumps(vals, ensure_ascii=False),
+             json.dumps(base, ensure_ascii=False), dirty, pending),
+        )
+
+    def _merge(self, vals: list, base: list, dirty: int, remote: dict) -> int:
+        """
+        Merge sheet values {column: value} into a local row in place.
+        Returns the new dirty mask.
+        """
+        for col, value in remote.items():
+            bit = 1 << col
+            if not dirty & bit:
+                vals[col] = base[col] = value
+                continue
+            if value == base[col]:
+                # Sheet unchanged since our last sync: local edit still to push
+                continue
+            if value == vals[col]:
+                # Both sides made the same edit
+                base[col] = value
+                dirty &= ~bit
+                continue
+
+            self.conflicts += 1
+            base[col] = value
+            if col in SHEET_WINS_COLUMNS:
+                vals[col] = value
+                dirty &= ~bit
+            # Otherwise the local value wins and stays dirty, to be pushed
+        return dirty
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+
+    def rows(self) -> list:
+        """All current rows in sheet order; rows not yet in the sheet come last."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT vals FROM requests ORDER BY pending_insert, row_idx, CAST(req_id AS INTEGER)"
+            ).fetchall()
+        return [json.loads(vals) for (vals,) in rows]
+
+    def pull(self, all_values: list):
+        """
+        Merge a full sheet read (header included) into the mirror.
+        Rows deleted from the sheet are dropped unless they are still waiting
+        to be inserted; pending rows found in the sheet count as inserted.
+        """
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db, "BEGIN IMMEDIATE"):
+                existing = {
+                    req_id: (json.loads(vals), json.loads(base), dirty)
+                    for req_id, vals, base, dirty in db.execute(
+                        "SELECT req_id, vals, base, dirty FROM requests"
+                    )
+                }
+                seen = set()
+                for i, row in enumerate(all_values[1:]):
+                    req_id = row[0].strip() if row else ""
+                    if not req_id:
+                        continue
+                    seen.add(req_id)
+                    remote = _pad(row, self.width)[:self.width]
+                    current = existing.get(req_id)
+                    if current is None:
+                        self._put(db, req_id, i + 2, remote, list(remote), 0, 0)
+                        continue
+                    vals, base, dirty = current
+                    if vals == remote and not dirty:
+                        db.execute(
+                            "UPDATE requests SET row_idx = ?, pending_insert = 0 WHERE req_id = ?",
+                            (i + 2, req_id),
+                        )
+                        continue
+                    dirty = self._merge(vals, base, dirty, dict(enumerate(remote)))
+                    self._put(db, req_id, i + 2, vals, base, dirty, 0)
+
+                for (req_id,) in db.execute(
+                    "SELECT req_id FROM requests WHERE pending_insert = 0"
+                ).fetchall():
+                    if req_id not in seen:
+                        # Deleted from the sheet by hand
+                        db.execute("DELETE FROM requests WHERE req_id = ?", (req_id,))
+        self.pulls += 1
+        logging.info(f"Mirror pulled {len(seen)} rows from the sheet")
+
+    def merge_remote(self, changes: dict) -> dict:
+        """
+        Merge polled sheet cells {req_id: {column: value}} in one transaction.
+        Returns {req_id: resolved row}, or None for requests the mirror does not know.
+        """
+        result = {}
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db, "BEGIN IMMEDIATE"):
+                for req_id, remote in changes.items():
+                    current = self._get(db, req_id)
+                    if current is None:
+                        result[req_id] = None
+                        continue
+                    row_idx, vals, base, dirty, pending = current
+                    dirty = self._merge(vals, base, dirty, remote)
+                    self._put(db, req_id, row_idx, vals, base, dirty, pending)
+                    result[req_id] = vals
+        return result
+
+    def insert_local(self, row: list):
+        """A new request created by the bot, not yet written to the sheet."""
+        row = _pad(row, self.width)
+        with self._lock:
+            self._put(self._db(), row[0], None, row, list(row), 0, 1)
+
+    def get_row(self, req_id: str):
+        """Current values of one request, or None."""
+        with self._lock:
+            current = self._get(self._db(), req_id)
+        return current[1] if current else None
+
+    def pending_inserts(self) -> list:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT vals FROM requests WHERE pending_insert = 1 ORDER BY CAST(req_id AS INTEGER)"
+            ).fetchall()
+        return [json.loads(vals) for (vals,) in rows]
+
+    def is_pending(self, req_id: str) -> bool:
+        with self._lock:
+            current = self._get(self._db(), req_id)
+        return bool(current and current[4])
+
+    def mark_inserted(self, rows_with_idx: list):
+        """
+        [(row_idx, row)] appended to the sheet. The appended values become
+        the base; columns edited after the row was read for the append stay dirty.
+        """
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db, "BEGIN IMMEDIATE"):
+                for row_idx, row in rows_with_idx:
+                    current = self._get(db, row[0])
+                    if current is None:
+                        continue
+                    _, vals, _, dirty, _ = current
+                    base = _pad(row, self.width)
+                    for col in range(self.width):
+                        if vals[col] == base[col]:
+                            dirty &= ~(1 << col)
+                    self._put(db, row[0], row_idx, vals, base, dirty, 0)
+
+    def update_local(self, updates: dict) -> set:
+        """
+        Bot-side edits {req_id: {column: value}} in one transaction.
+        Returns the IDs that were found and updated.
+        """
+        updated = set()
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db, "BEGIN IMMEDIATE"):
+                for req_id, values in updates.items():
+                    current = self._get(db, req_id)
+                    if current is None:
+                        continue
+                    row_idx, vals, base, dirty, pending = current
+                    for col, value in values.items():
+                        # For a row not in the sheet yet, base is the row as queued:
+                        # the edit stays dirty until an append or push carries it
+                        vals[col] = value
+                        if value != base[col]:
+                            dirty |= 1 << col
+                        else:
+                            dirty &= ~(1 << col)
+                    self._put(db, req_id, row_idx, vals, base, dirty, pending)
+                    updated.add(req_id)
+        return updated
+
+    def sync_states(self, req_ids) -> dict:
+        """
+        {req_id: None if not in the mirror, "pending" (not appended yet),
+        "dirty" (edits not pushed yet) or "synced"}.
+        """
+        result = {}
+        with self._lock:
+            db = self._db()
+            for req_id in req_ids:
+                row = db.execute(
+                    "SELECT dirty, pending_insert FROM requests WHERE req_id = ?", (req_id,)
+                ).fetchone()
+                if row is None:
+                    result[req_id] = None
+                else:
+                    dirty, pending = row
+                    result[req_id] = "pending" if pending else "dirty" if dirty else "synced"
+        return result
+
+    def dirty_rows(self) -> list:
+        """[(req_id, row_idx, {column: value})] for local edits not yet in the sheet."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT req_id, row_idx, vals, dirty FROM requests "
+                "WHERE dirty != 0 AND pending_insert = 0"
+            ).fetchall()
+        result = []
+        for req_id, row_idx, vals, dirty in rows:
+            vals = json.loads(vals)
+            result.append((req_id, row_idx, {
+                col: vals[col] for col in range(self.width) if dirty & (1 << col)
+            }))
+        return result
+
+    def mark_synced(self, pushed: list):
+        """
+        [(req_id, {column: value})] written to the sheet. Pushed cells become
+        the new base, and stay dirty only if they were edited again meanwhile.
+        """
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db, "BEGIN IMMEDIATE"):
+                for req_id, values in pushed:
+                    current = self._get(db, req_id)
+                    if current is None:
+                        continue
+                    row_idx, vals, base, dirty, pending = current
+                    for col, value in values.items():
+                        base[col] = value
+                        if vals[col] == value:
+                            dirty &= ~(1 << col)
+                    self._put(db, req_id, row_idx, vals, base, dirty, pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._db()
+            rows, dirty, pending = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(dirty != 0), 0), COALESCE(SUM(pending_insert), 0) "
+                "FROM requests"
+            ).fetchone()
+        return {
+            "rows": rows,
+            "dirty_rows": dirty,
+            "pending_inserts": pending,
+            "conflicts": self.conflicts,
+            "pulls": self.pulls,
+        }
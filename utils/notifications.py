@@ -1,8 +1,18 @@
-from aiogram.types import FSInputFile
+import logging
+
+from aiogram.types import InputMediaDocument, InputMediaPhoto
 from loader import bot
 from config import config
+from utils.outbox import outbox
+
+# Telegram albums hold 2-10 items
+MEDIA_GROUP_SIZE = 10
 
-async def notify_owner_client(data: dict):
+async def notify_owner_client(data: dict, dedup_key: str = None):
+    """
+    Queue the new client request for all admins and return at once.
+    dedup_key identifies the submission, so a re-delivered update doesn't notify twice.
+    """
     text = (
         "Тип заявки: КЛИЕНТ\n\n"
         f"👤 Имя: {data.get('name')}\n"
@@ -14,13 +24,10 @@ async def notify_owner_client(data: dict):
         f"🔨 Стадия ремонта: {data.get('stage')}\n"
         f"📝 Задача: {data.get('description')}\n"
     )
-    for admin_id in config.tg_bot.admin_ids:
-        try:
-            await bot.send_message(admin_id, text)
-        except Exception as e:
-            print(f"Failed to notify admin {admin_id}: {e}")
+    await _enqueue_for_admins("admin_client", {"text": text}, dedup_key)
 
-async def notify_owner_partner(data: dict, files: list = None):
+async def notify_owner_partner(data: dict, files: list = None, dedup_key: str = None):
+    """Queue the new partner request with its attachments for all admins (see notify_owner_client)."""
     text = (
         f"💼 Роль партнера: {data.get('role')}\n"
         f"👤 Имя: {data.get('name')}\n"
@@ -50,30 +57,44 @@ async def notify_owner_partner(data: dict, files: list = None):
         if terms_custom:
             text += f"{terms_custom}\n"
     
-    for admin_id in config.tg_bot.admin_ids:
+    await _enqueue_for_admins("admin_partner", {"text": text, "files": files or []}, dedup_key)
+
+async def _notify_admin_partner(admin_id: int, text: str, files: list):
+    await bot.send_message(admin_id, text)
+    # files are {'type': 'photo' | 'document', 'id': file_id} from the partner flow;
+    # albums can't mix photos with documents, so each kind is grouped separately
+    photos = [f['id'] for f in files if isinstance(f, dict) and f.get('type') == 'photo']
+    documents = [f['id'] for f in files if isinstance(f, dict) and f.get('type') != 'photo']
+    for i in range(0, len(photos), MEDIA_GROUP_SIZE):
+        await _send_album(admin_id, photos[i:i + MEDIA_GROUP_SIZE], InputMediaPhoto, bot.send_photo)
+    for i in range(0, len(documents), MEDIA_GROUP_SIZE):
+        await _send_album(admin_id, documents[i:i + MEDIA_GROUP_SIZE], InputMediaDocument, bot.send_document)
+
+async def _send_album(admin_id: int, file_ids: list, media_type, send_single):
+    """One media group; if it fails, each file separately so one bad file doesn't drop the rest."""
+    if len(file_ids) > 1:
         try:
-            await bot.send_message(admin_id, text)
-            if files:
-                # files is a list of file_ids (photos/docs)
-                # Note: sending file_id directly works if bot has access.
-                # If these are new uploads from user, we can forward or send copy.
-                # The prompt said "attached files/photos".
-                # aiogram send_media_group or loop send_document/photo
-                for file_obj in files:
-                   # Simplification: just send them assuming they are valid file_ids or inputfiles
-                   # Spec says "accept documents or images". We stored them in data['project_files'] potentially?
-                   # This function takes 'files' arg.
-                   
-                   # We need to know content type to use correct method or use send_document for everything?
-                   # Photos better as send_photo.
-                   # For simplicity, if we stored file_id + type we can route.
-                   # For now let's assume valid sending method.
-                   
-                   # Implementation detail in handler needs to pass struct: {'type': 'photo', 'id': ...}
-                   if isinstance(file_obj, dict):
-                       if file_obj['type'] == 'photo':
-                           await bot.send_photo(admin_id, file_obj['id'])
-                       else:
-                           await bot.send_document(admin_id, file_obj['id'])
+            await bot.send_media_group(admin_id, [media_type(media=file_id) for file_id in file_ids])
+            return
         except Exception as e:
-            print(f"Failed to notify admin {admin_id}: {e}")
+            logging.warning(f"Album to admin {admin_id} failed, sending files one by one: {e}")
+    for file_id in file_ids:
+        try:
+            await send_single(admin_id, file_id)
+        except Exception as e:
+            logging.error(f"Failed to send file to admin {admin_id}: {e}")
+
+async def _enqueue_for_admins(kind: str, payload: dict, dedup_key: str = None):
+    """One outbox job per admin; the outbox workers deliver them concurrently."""
+    for admin_id in config.tg_bot.admin_ids:
+        key = f"{kind}:{dedup_key}:{admin_id}" if dedup_key else None
+        await outbox.enqueue(kind, admin_id, payload, dedup_key=key)
+
+async def _deliver_admin_message(admin_id: int, payload: dict):
+    await bot.send_message(admin_id, payload["text"])
+
+async def _deliver_admin_partner(admin_id: int, payload: dict):
+    await _notify_admin_partner(admin_id, payload["text"], payload["files"])
+
+outbox.register("admin_client", _deliver_admin_message)
+outbox.register("admin_partner", _deliver_admin_partner)
@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from config import config
+from utils import metrics
+
+# Attempts for transient (network/server) errors before a message is dropped
+MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.total_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.total_wait += wait
+                await asyncio.sleep(wait)
+
+
+class NotificationDispatcher:
+    """
+    Sends Telegram messages within the Bot API limits:
+    a global token bucket (~30 msg/s), at most one message per chat per
+    `per_chat_interval`, a fixed pool of sender workers and retry-after
+    handling. Messages to the same chat are delivered in enqueue order.
+    """
+
+    def __init__(self, global_rate: float, per_chat_interval: float, workers: int):
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self._bucket = TokenBucket(global_rate)
+        self._bot = None
+        # {chat_id: deque[(text, kwargs, future, attempts)]}
+        self._chats = {}
+        # Chats with pending messages that no worker is handling right now
+        self._ready = asyncio.Queue()
+        self._last_sent = {}
+        self._paused_until = 0.0
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+        self.in_flight = 0
+
+    def start(self, bot: Bot):
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """
+        Queue a message without waiting. The returned future resolves to the
+        sent Message, or to an exception if delivery finally failed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = collections.deque()
+            self._ready.put_nowait(chat_id)
+        queue.append((text, kwargs, future, 0))
+        return future
+
+    def _reschedule(self, chat_id: int, delay: float):
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._chats[chat_id]
+
+            # Per-chat limit: come back later instead of holding this worker
+            now = time.monotonic()
+            wait = max(
+                self._last_sent.get(chat_id, 0.0) + self.per_chat_interval,
+                self._paused_until,
+            ) - now
+            if wait > 0:
+                self._reschedule(chat_id, wait)
+                continue
+
+            await self._bucket.acquire()
+            text, kwargs, future, attempts = queue[0]
+            self.in_flight += 1
+            try:
+                message = await self._bot.send_message(chat_id, text, **kwargs)
+                self.sent += 1
+                if not future.done():
+                    future.set_result(message)
+            except TelegramRetryAfter as e:
+                # Flood control: pause all sends and retry this message first
+                self.retry_after += 1
+                self._paused_until = time.monotonic() + e.retry_after
+                logging.warning(f"Telegram flood control, pausing sends for {e.retry_after}s")
+                self._reschedule(chat_id, e.retry_after)
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Not retryable: user blocked the bot, chat not found, etc.
+                self._fail(future, chat_id, e)
+            except Exception as e:
+                if attempts + 1 < MAX_ATTEMPTS:
+                    queue[0] = (text, kwargs, future, attempts + 1)
+                    self._reschedule(chat_id, 2 ** attempts)
+                    continue
+                self._fail(future, chat_id, e)
+            finally:
+                self.in_flight -= 1
+                self._last_sent[chat_id] = time.monotonic()
+
+            queue.popleft()
+            if queue:
+                self._reschedule(chat_id, self.per_chat_interval)
+            else:
+                del self._chats[chat_id]
+                self._prune_last_sent()
+
+    def _prune_last_sent(self):
+        # Only recent sends matter for the per-chat limit
+        if len(self._last_sent) > 1000:
+            cutoff = time.monotonic() - self.per_chat_interval
+            self._last_sent = {c: t for c, t in self._last_sent.items() if t > cutoff}
+
+    def _fail(self, future, chat_id, error):
+        self.failed += 1
+        logging.error(f"Failed to send notification to {chat_id}: {error}")
+        if not future.done():
+            future.set_exception(error)
+            # Fire-and-forget callers never await it; don't warn about that
+            future.exception()
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(q) for q in self._chats.values()),
+            "chats": len(self._chats),
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+            "bucket_wait_sec": round(self._bucket.total_wait, 2),
+        }
+
+
+notification_dispatcher = NotificationDispatcher(
+    global_rate=config.tg_bot.global_rate,
+    per_chat_interval=config.tg_bot.per_chat_interval,
+    workers=config.tg_bot.send_workers,
+)
+metrics.register("notifications", notification_dispatcher.stats)
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+
+from config import config
+from utils import local_db, metrics
+
+# Delivered jobs are kept this long so their dedup keys still match
+RETENTION_SEC = 24 * 3600
+# Delay before the first retry; doubles with every attempt
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 600
+# How often the pump re-checks the table without being woken up
+POLL_INTERVAL = 5
+
+
+class Outbox:
+    """
+    Durable notification queue in SQLite. enqueue() stores a job and returns;
+    a pool of workers delivers it through the handler registered for its kind,
+    retrying with backoff. Jobs that keep failing, or fail for good (blocked
+    bot, chat not found), are kept as dead letters. A dedup key makes
+    enqueueing the same notification twice a no-op. Jobs interrupted by a
+    restart are delivered on next start (at least once).
+    """
+
+    def __init__(self, workers: int, max_attempts: int, db_name: str = "state.db"):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._db_name = db_name
+        self._lock = threading.Lock()
+        self._conn = None
+        # {kind: async deliver(chat_id, payload)}
+        self._handlers = {}
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._in_flight = set()
+        self._tasks = []
+        self.enqueued = 0
+        self.duplicates = 0
+        self.delivered = 0
+        self.retries = 0
+        self.dead = 0
+        self._total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = local_db.connect(self._db_name)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, dedup_key TEXT UNIQUE, "
+                "kind TEXT NOT NULL, chat_id INTEGER NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, created REAL NOT NULL, last_error TEXT)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)"
+            )
+        return self._conn
+
+    def register(self, kind: str, deliver):
+        """deliver(chat_id, payload) is awaited for each job of this kind; raise to retry."""
+        self._handlers[kind] = deliver
+
+    def _insert(self, kind, chat_id, payload, dedup_key) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._db().execute(
+                "INSERT OR IGNORE INTO outbox (dedup_key, kind, chat_id, payload, next_attempt, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (dedup_key, kind, chat_id, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+        return cursor.rowcount > 0
+
+    async def enqueue(self, kind: str, chat_id: int, payload: dict, dedup_key: str = None) -> bool:
+        """Store a job for delivery. Returns False if its dedup key was already queued."""
+        added = await asyncio.to_thread(self._insert, kind, chat_id, payload, dedup_key)
+        if added:
+            self.enqueued += 1
+            self._wakeup.set()
+        else:
+            self.duplicates += 1
+        return added
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._pump())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Unfinished jobs stay pending in the table and are delivered on next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _due(self, exclude: set, limit: int):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                "SELECT id, kind, chat_id, payload, attempts, created FROM outbox "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (now, limit + len(exclude)),
+            ).fetchall()
+            next_due = db.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending' AND next_attempt > ?",
+                (now,),
+            ).fetchone()[0]
+            db.execute(
+                "DELETE FROM outbox WHERE status = 'done' AND created < ?", (now - RETENTION_SEC,)
+            )
+        return [row for row in rows if row[0] not in exclude][:limit], next_due
+
+    async def _pump(self):
+        """Feed due jobs to the workers; woken by enqueue, otherwise polls."""
+        while True:
+            try:
+                self._wakeup.clear()
+                jobs, next_due = await asyncio.to_thread(self._due, set(self._in_flight), 100)
+                for job in jobs:
+                    self._in_flight.add(job[0])
+                    self._queue.put_nowait(job)
+                timeout = POLL_INTERVAL
+                if next_due is not None:
+                    timeout = min(timeout, max(0.05, next_due - time.time()))
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error reading the outbox: {e}")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    def _finish(self, job_id: int, status: str, attempts: int, next_attempt: float, error: str):
+        with self._lock:
+            self._db().execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt, error, job_id),
+            )
+
+    async def _worker(self):
+        while True:
+            job_id, kind, chat_id, payload, attempts, created = await self._queue.get()
+            try:
+                await self._deliver(job_id, kind, chat_id, json.loads(payload), attempts, created)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error updating outbox job {job_id}: {e}")
+            finally:
+                self._in_flight.discard(job_id)
+
+    async def _deliver(self, job_id, kind, chat_id, payload, attempts, created):
+        attempts += 1
+        try:
+            deliver = self._handlers.get(kind)
+            if deliver is None:
+                raise RuntimeError(f"no handler for outbox job kind {kind!r}")
+            await deliver(chat_id, payload)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Retrying won't help: bot blocked, chat not found, etc.
+            await self._dead(job_id, kind, chat_id, attempts, e)
+            return
+        except Exception as e:
+            if attempts >= self.max_attempts:
+                await self._dead(job_id, kind, chat_id, attempts, e)
+                return
+            self.retries += 1
+            delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+            logging.warning(f"Outbox {kind} to {chat_id} failed (attempt {attempts}), retry in {delay}s: {e}")
+            await asyncio.to_thread(self._finish, job_id, "pending", attempts, time.time() + delay, str(e))
+            self._wakeup.set()
+            return
+
+        latency = time.time() - created
+        self.delivered += 1
+        self._total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        await asyncio.to_thread(self._finish, job_id, "done", attempts, 0, None)
+
+    async def _dead(self, job_id, kind, chat_id, attempts, error):
+        self.dead += 1
+        logging.error(f"Outbox {kind} to {chat_id} moved to dead letters after {attempts} attempts: {error}")
+        await asyncio.to_thread(self._finish, job_id, "dead", attempts, 0, str(error))
+
+    def _counts(self) -> dict:
+        with self._lock:
+            rows = self._db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    def stats(self) -> dict:
+        counts = self._counts()
+        return {
+            "depth": counts.get("pending", 0),
+            "in_flight": len(self._in_flight),
+            "dead_letters": counts.get("dead", 0),
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "delivered": self.delivered,
+            "retries": self.retries,
+            "dead": self.dead,
+            "avg_latency_ms": round(self._total_latency / max(1, self.delivered) * 1000, 1),
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+        }
+
+
+outbox = Outbox(
+    workers=config.tg_bot.outbox_workers,
+    max_attempts=config.tg_bot.outbox_max_attempts,
+)
+metrics.register("outbox", outbox.stats)
@@ -0,0 +1,52 @@
+import datetime
+import zoneinfo
+
+
+def parse_hours(value: str):
+    """'9-21' -> (9, 21); empty -> None."""
+    if not value:
+        return None
+    start, end = value.split("-")
+    return int(start), int(end)
+
+
+class AdaptivePollScheduler:
+    """
+    Picks the sleep before the next poll: the minimum interval right after
+    changes were seen, then exponential backoff up to a ceiling while the
+    sheet stays idle. During working hours the ceiling is lower.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, work_max_interval: float = None,
+                 work_hours: str = "", timezone: str = "UTC", backoff: float = 2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.work_max_interval = work_max_interval or max_interval
+        self.work_hours = parse_hours(work_hours)
+        self.timezone = zoneinfo.ZoneInfo(timezone)
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def in_work_hours(self, now: datetime.datetime = None) -> bool:
+        if self.work_hours is None:
+            return False
+        now = now or datetime.datetime.now(self.timezone)
+        start, end = self.work_hours
+        return start <= now.hour < end
+
+    def ceiling(self, now: datetime.datetime = None) -> float:
+        return self.work_max_interval if self.in_work_hours(now) else self.max_interval
+
+    def next_interval(self, changed: bool, now: datetime.datetime = None) -> float:
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = self.interval * self.backoff
+        self.interval = max(self.min_interval, min(self.interval, self.ceiling(now)))
+        return self.interval
+
+    def stats(self) -> dict:
+        return {
+            "interval_sec": self.interval,
+            "work_hours": self.in_work_hours(),
+        }
@@ -0,0 +1,80 @@
+import logging
+import threading
+
+from utils import local_db
+
+
+class PollSnapshot:
+    """
+    On-disk copy of the poller's baseline ({request_id: (status, fingerprint)})
+    in SQLite, updated incrementally after each poll so a restart can diff
+    against the live sheet and catch up on missed status changes.
+    Also counts the polls that saved changes (the cycle), a monotonic
+    number the poller uses to tell notifications apart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.writes = 0
+        self.cycle = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = local_db.connect()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS poll_snapshot ("
+                "req_id TEXT PRIMARY KEY, status TEXT NOT NULL, fp INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS poll_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            row = self._conn.execute("SELECT value FROM poll_state WHERE name = 'cycle'").fetchone()
+            self.cycle = row[0] if row else 0
+        return self._conn
+
+    def next_cycle(self) -> int:
+        """The cycle number the next save() with changes will record."""
+        with self._lock:
+            self._db()
+            return self.cycle + 1
+
+    def load(self):
+        """Returns (statuses, fingerprints) dicts; both empty if there is no snapshot."""
+        with self._lock:
+            rows = self._db().execute("SELECT req_id, status, fp FROM poll_snapshot").fetchall()
+        statuses = {req_id: status for req_id, status, _ in rows}
+        fingerprints = {req_id: fp for req_id, _, fp in rows}
+        logging.info(f"Loaded poller snapshot with {len(rows)} requests")
+        return statuses, fingerprints
+
+    def save(self, changed: dict, removed=()):
+        """
+        Persist changed rows ({request_id: data}), drop removed ones and
+        advance the cycle, in one transaction.
+        """
+        if not changed and not removed:
+            return
+        with self._lock:
+            db = self._db()
+            with local_db.transaction(db):
+                db.executemany(
+                    "INSERT OR REPLACE INTO poll_snapshot (req_id, status, fp) VALUES (?, ?, ?)",
+                    [(req_id, data["status"], data["fp"]) for req_id, data in changed.items()],
+                )
+                db.executemany(
+                    "DELETE FROM poll_snapshot WHERE req_id = ?", [(req_id,) for req_id in removed]
+                )
+                db.execute(
+                    "INSERT INTO poll_state (name, value) VALUES ('cycle', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                    (self.cycle + 1,),
+                )
+            self.cycle += 1
+            self.writes += 1
+
+    def stats(self) -> dict:
+        return {"writes": self.writes, "cycle": self.cycle}
+
+
+poll_snapshot = PollSnapshot()
@@ -1,89 +1,189 @@
 import asyncio
 import logging
 from aiogram import Bot
-from aiogram.exceptions import TelegramAPIError
-from utils import google_sheets
+from utils import google_sheets, metrics
+from utils.change_detector import RevisionChangeDetector
+from utils.poll_scheduler import AdaptivePollScheduler
+from utils.poll_snapshot import poll_snapshot
+from utils.quota_governor import Lane, set_lane
+from config import config
+from utils.notify_dispatcher import notification_dispatcher
+from utils.outbox import outbox
 import texts
 
 # Store valid previous states to compare against
 # Structure: {request_id: "status_string"}
 previous_statuses = {}
-# Store previous full data to detect any changes, not just status
-previous_full_data = {}
+# Fingerprints of the polled columns to detect any change, not just status
+# Structure: {request_id: int}
+previous_fingerprints = {}
 
-async def start_status_polling(bot: Bot):
+poll_stats = {"performed": 0, "skipped": 0}
+scheduler = AdaptivePollScheduler(
+    min_interval=config.poller.min_interval,
+    max_interval=config.poller.max_interval,
+    work_max_interval=config.poller.work_max_interval,
+    work_hours=config.poller.work_hours,
+    timezone=config.poller.timezone,
+)
+metrics.register("poller", lambda: {**poll_stats, **scheduler.stats(), **poll_snapshot.stats()})
+
+def diff_snapshot(columns: dict, fingerprints: dict):
+    """
+    Compare the polled columns with the given fingerprints. Only rows whose
+    fingerprint changed get a data dict; run it in a worker thread.
+    Returns ({request_id: data} for changed or new rows, [removed request IDs]).
+    """
+    current = google_sheets.polled_fingerprints(columns)
+    changed = {
+        req_id: google_sheets.polled_row(columns, i, fp)
+        for req_id, (fp, i) in current.items()
+        if fingerprints.get(req_id) != fp
+    }
+    removed = [req_id for req_id in fingerprints if req_id not in current]
+    return changed, removed
+
+def _baseline(columns: dict):
+    """(statuses, fingerprints, data) of every polled row, for the first run."""
+    data, _ = diff_snapshot(columns, {})
+    statuses = {k: v['status'] for k, v in data.items()}
+    fingerprints = {k: v['fp'] for k, v in data.items()}
+    return statuses, fingerprints, data
+
+async def _deliver_status(chat_id: int, payload: dict):
+    # The dispatcher applies the Telegram rate limits; its future fails if
+    # the message could not be sent, and the outbox then retries
+    await notification_dispatcher.enqueue(chat_id, payload["text"])
+
+outbox.register("user_status", _deliver_status)
+
+async def notify_status_change(req_id: str, data: dict, cycle: int):
+    """
+    Queue a notification to the request's author about a new status,
+    if we have their TG ID. The job is stored in the outbox, so it survives
+    a restart; this never waits for Telegram. The dedup key (request and
+    poll cycle) stops a poll replayed after a crash from notifying twice:
+    the cycle only advances once the poll's changes are saved.
+    """
+    tg_id = data.get('tg_id')
+    if not (tg_id and tg_id.isdigit()):
+        return
+    try:
+        # Extract additional information for the notification
+        comment = data.get('comment') or 'нет'
+
+        # Estimate link is not tracked in the polled columns
+        estimate_link = data.get('files') or 'не заполнено'
+
+        # Map Russian status to English for notification
+        english_status = google_sheets.map_status_to_english(data['status'])
+
+        # Construct message using the specification template:
+        # "Your request #<Request ID> status has changed to: <New Status>.
+        # Comment: <Comment from the table, if any>.
+        # Estimate: <Link or note if field filled>"
+        message = f"Статус вашей заявки #{req_id} изменён на: {english_status}.\nКомментарий: {comment}.\nСмета: {estimate_link}"
+
+        await outbox.enqueue(
+            "user_status", int(tg_id), {"text": message},
+            dedup_key=f"status:{req_id}:{cycle}",
+        )
+        logging.info(f"Queued notification to user {tg_id} about status change for req {req_id}")
+    except Exception as e:
+        logging.error(f"Failed to notify user {tg_id}: {e}")
+
+async def poll_once(detector) -> bool:
+    """
+    One poll cycle: diff the polled columns against the baseline, queue
+    notifications for status changes and persist the changed rows.
+    Returns True if any row changed.
+    """
+    poll_stats["performed"] += 1
+    columns = await google_sheets.read_polled_columns()
+    if not columns:
+        # Read failed or sheet is empty: keep the previous baseline
+        return False
+
+    # The fingerprints are only changed below, after the diff is done
+    changed, removed = await asyncio.to_thread(diff_snapshot, columns, previous_fingerprints)
+    cycle = await asyncio.to_thread(poll_snapshot.next_cycle)
+    if changed or removed:
+        logging.info(f"Poll: {len(changed)} changed, {len(removed)} removed requests")
+        await google_sheets.apply_polled_changes(changed, removed)
+    elif detector.tracks_revision:
+        # The spreadsheet changed, but not in the polled columns: an admin
+        # edited name, phone, etc. Re-read the whole sheet into the mirror.
+        logging.info("Poll: revision changed outside the polled columns, pulling the sheet")
+        await google_sheets.pull_sheet(await google_sheets.get_async_service())
+
+    for req_id, data in changed.items():
+        old_status = previous_statuses.get(req_id)
+
+        # Check for status change
+        if old_status and data['status'] != old_status:
+            await notify_status_change(req_id, data, cycle)
+
+        # Update state
+        previous_statuses[req_id] = data['status']
+        previous_fingerprints[req_id] = data['fp']
+
+    for req_id in removed:
+        previous_statuses.pop(req_id, None)
+        previous_fingerprints.pop(req_id, None)
+
+    await asyncio.to_thread(poll_snapshot.save, changed, removed)
+    detector.acknowledge()
+    return bool(changed or removed)
+
+async def start_status_polling(bot: Bot, detector=None):
     """
     Periodically checks Google Sheets for status changes and notifies users.
-    Also detects any data changes in the spreadsheet.
+    A cheap revision check skips the read when the spreadsheet is unchanged;
+    otherwise only the polled columns are read, and only rows whose
+    fingerprint changed are processed.
+    The baseline is persisted, so after a restart changes made while the
+    bot was down are diffed and notified right away.
+    detector: ChangeDetector, defaults to the Drive revision check.
     """
     logging.info("Starting status poller...")
-    global previous_statuses, previous_full_data
+    # Polling yields the Sheets quota to users and writes
+    set_lane(Lane.POLLER)
+    global previous_statuses, previous_fingerprints
     
     # Check if Google Sheets is configured
-    sheet = google_sheets.get_service()
+    sheet = await google_sheets.get_async_service()
     if sheet is None:
         logging.warning("Google Sheets not configured. Poller will not run.")
         return
     
-    # Initial fetch to populate state without notifying
-    initial_data = await google_sheets.get_all_requests_status()
-    previous_statuses = {k: v['status'] for k, v in initial_data.items()}
-    previous_full_data = initial_data.copy()
-    
+    if detector is None:
+        detector = RevisionChangeDetector(google_sheets.fetch_revision)
+
+    previous_statuses, previous_fingerprints = await asyncio.to_thread(poll_snapshot.load)
+    await detector.check()
+    if previous_fingerprints:
+        # Catch up: notify about changes made while we were down
+        changed = await poll_once(detector)
+    else:
+        # First run: populate the baseline without notifying
+        columns = await google_sheets.read_polled_columns()
+        previous_statuses, previous_fingerprints, initial_data = await asyncio.to_thread(_baseline, columns)
+        if initial_data:
+            await asyncio.to_thread(poll_snapshot.save, initial_data)
+            detector.acknowledge()
+        changed = False
+
     while True:
         try:
-            await asyncio.sleep(60) # Poll every 60 seconds
-            
-            current_data = await google_sheets.get_all_requests_status()
-            
-            for req_id, data in current_data.items():
-                new_status = data['status']
-                old_status = previous_statuses.get(req_id)
-                
-                # Check for status change
-                if old_status and new_status != old_status:
-                    # Status changed!
-                    # Notify user if we have their TG ID
-                    tg_id = data.get('tg_id')
-                    if tg_id and tg_id.isdigit():
-                        try:
-                            # Extract additional information for the notification
-                            comment = data.get('desc', 'нет')
-                            if not comment:
-                                comment = 'нет'
-                            
-                            # For estimate link, we'll check if there are files
-                            estimate_link = data.get('files', 'не заполнено')
-                            if not estimate_link:
-                                estimate_link = 'не заполнено'
-                            
-                            # Map Russian status to English for notification
-                            english_status = google_sheets.map_status_to_english(new_status)
-                            
-                            # Construct message using the specification template:
-                            # "Your request #<Request ID> status has changed to: <New Status>.
-                            # Comment: <Comment from the table, if any>.
-                            # Estimate: <Link or note if field filled>"
-                            message = f"Статус вашей заявки #{req_id} изменён на: {english_status}.\nКомментарий: {comment}.\nСмета: {estimate_link}"
-                             
-                            await bot.send_message(int(tg_id), message)
-                            logging.info(f"Notified user {tg_id} about status change for req {req_id}")
-                        except TelegramAPIError as e:
-                            logging.error(f"Failed to notify user {tg_id} via Telegram: {e}")
-                        except Exception as e:
-                            logging.error(f"Failed to notify user {tg_id}: {e}")
-                
-                # Check for any data changes (not just status)
-                old_data = previous_full_data.get(req_id)
-                if old_data and data != old_data:
-                    # Any data changed - log it
-                    logging.info(f"Data changed for request {req_id}")
-                    # We could implement additional notifications or actions here if needed
-                    
-                # Update state
-                previous_statuses[req_id] = new_status
-                previous_full_data[req_id] = data.copy()
+            # Poll often right after changes, back off while the sheet is idle
+            await asyncio.sleep(scheduler.next_interval(changed))
+            changed = False
+
+            if not await detector.check():
+                poll_stats["skipped"] += 1
+                continue
+
+            changed = await poll_once(detector)
                 
         except Exception as e:
             logging.error(f"Error in poller loop: {e}")
-            await asyncio.sleep(60) # Wait before retry
@@ -0,0 +1,143 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import enum
+import heapq
+import itertools
+import time
+
+
+class Lane(enum.IntEnum):
+    """Priority classes for Google Sheets calls, most urgent first."""
+    INTERACTIVE = 0
+    WRITES = 1
+    POLLER = 2
+    MAINTENANCE = 3
+
+
+# Lane of the code currently making Sheets calls; handlers keep the default
+current_lane = contextvars.ContextVar("sheets_lane", default=Lane.INTERACTIVE)
+
+
+def set_lane(lane: Lane):
+    """Put the current task (e.g. a background loop) in a lane for good."""
+    current_lane.set(lane)
+
+
+@contextlib.contextmanager
+def lane(value: Lane):
+    """Run a block of Sheets calls in a lane."""
+    token = current_lane.set(value)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+class QuotaGovernor:
+    """
+    Shares the per-minute Sheets quota between callers.
+    A token bucket refills at per_minute / 60 tokens per second; waiting
+    calls are granted strictly by lane, then by arrival. Poller and
+    maintenance calls are deferred while the bucket is below `reserve`
+    (a fraction of its capacity), which stays available to users and writes.
+    """
+
+    def __init__(self, per_minute: int, reserve: float = 0.25):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self.capacity = float(per_minute)
+        self.reserve = self.capacity * reserve
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # [(lane, seq, future)]
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Grant times within the last minute
+        self._recent = collections.deque()
+        self.granted = {l.name.lower(): 0 for l in Lane}
+        self.deferred = 0
+        self._total_wait = {l.name.lower(): 0.0 for l in Lane}
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _needed(self, lane: Lane) -> float:
+        return 1 + (self.reserve if lane >= Lane.POLLER else 0)
+
+    async def acquire(self, lane: Lane = None):
+        """Wait for one call's worth of quota; lane defaults to the current one."""
+        lane = current_lane.get() if lane is None else lane
+        started = time.monotonic()
+        self._refill()
+        if not self._waiters and self._tokens >= self._needed(lane):
+            self._tokens -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (lane, next(self._seq), future))
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._dispatch())
+            self._wakeup.set()
+            await future
+        self._record(lane, time.monotonic() - started)
+
+    async def _dispatch(self):
+        while self._waiters:
+            lane, _, future = self._waiters[0]
+            if future.done():
+                # Caller was cancelled (timeout, shutdown)
+                heapq.heappop(self._waiters)
+                continue
+
+            self._refill()
+            needed = self._needed(lane)
+            if self._tokens >= needed:
+                heapq.heappop(self._waiters)
+                self._tokens -= 1
+                future.set_result(None)
+                continue
+
+            if needed > 1 and self._tokens >= 1:
+                self.deferred += 1
+            # Sleep until enough quota, or until a more urgent call arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), (needed - self._tokens) / self.rate)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, lane: Lane, waited: float):
+        name = Lane(lane).name.lower()
+        self.granted[name] += 1
+        self._total_wait[name] += waited
+        self.max_wait = max(self.max_wait, waited)
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent and self._recent[0] < now - 60:
+            self._recent.popleft()
+
+    def stats(self) -> dict:
+        self._refill()
+        now = time.monotonic()
+        while self._recent and self._recent[0] < now - 60:
+            self._recent.popleft()
+        waiting = collections.Counter(Lane(l).name.lower() for l, _, f in self._waiters if not f.done())
+        return {
+            "quota_per_minute": self.per_minute,
+            "used_last_minute": len(self._recent),
+            "tokens": round(self._tokens, 1),
+            "waiting": dict(waiting),
+            "granted": dict(self.granted),
+            "deferred": self.deferred,
+            "avg_wait_ms": {
+                name: round(self._total_wait[name] / count * 1000, 1)
+                for name, count in self.granted.items() if count
+            },
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
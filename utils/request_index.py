@@ -0,0 +1,181 @@
+import logging
+
+from utils.columns import COL_ID, COL_PHONE, COL_TG_ID
+
+
+def normalize_phone(value: str) -> str:
+    """Digits only; the last 10 digits so +7 / 8 prefixes match each other."""
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    return digits[-10:] if len(digits) > 10 else digits
+
+
+def _get_col(row, i):
+    return row[i] if i < len(row) else ""
+
+
+class RequestIndex:
+    """
+    Local snapshot of the sheet's data rows with hash maps
+    request ID -> row, Telegram ID -> rows and normalized phone -> rows.
+    Positions are 0-based offsets into `rows`; the sheet row number is position + 2.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.by_id = {}
+        self.by_tg_id = {}
+        self.by_phone = {}
+        self.max_id = 0
+        self.loaded = False
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+        # Appends and cell updates made while a replacement is being built
+        self._changes = None
+        self._invalidated = False
+
+    def load(self, all_values: list):
+        """Replace the snapshot with a full sheet read (header row included)."""
+        self.rows = [list(row) for row in all_values[1:]]
+        self._rebuild()
+        self.loaded = True
+        self.loads += 1
+        logging.info(f"Request index loaded: {len(self.by_id)} requests")
+
+    def start_rebuild(self):
+        """Record appends and cell updates until replace() carries them over."""
+        self._changes = []
+        self._invalidated = False
+
+    def cancel_rebuild(self):
+        self._changes = None
+
+    def replace(self, other: "RequestIndex"):
+        """
+        Take over a snapshot built elsewhere (e.g. in a worker thread),
+        re-applying the changes recorded here since start_rebuild().
+        An invalidate() meanwhile leaves the new snapshot invalid too.
+        """
+        changes, self._changes = self._changes or [], None
+        for req_id, values, row in changes:
+            if req_id in other.by_id:
+                other.update_cells(req_id, values)
+            elif row is not None:
+                other.append(row)
+        self.rows = other.rows
+        self.by_id = other.by_id
+        self.by_tg_id = other.by_tg_id
+        self.by_phone = other.by_phone
+        self.max_id = other.max_id
+        self.loaded = not self._invalidated
+        self.loads += 1
+
+    def invalidate(self):
+        """Force a full reload on next use."""
+        self.loaded = False
+        self._invalidated = True
+
+    def _rebuild(self):
+        self.by_id = {}
+        self.by_tg_id = {}
+        self.by_phone = {}
+        self.max_id = 0
+        for pos, row in enumerate(self.rows):
+            self._add(pos, row)
+
+    def _add(self, pos: int, row: list):
+        r_id = _get_col(row, COL_ID).strip()
+        if not r_id:
+            return
+        self.by_id[r_id] = pos
+        if r_id.isdigit():
+            self.max_id = max(self.max_id, int(r_id))
+
+        tg_id = _get_col(row, COL_TG_ID).strip()
+        if tg_id:
+            self.by_tg_id.setdefault(tg_id, []).append(pos)
+
+        phone = normalize_phone(_get_col(row, COL_PHONE))
+        if phone:
+            self.by_phone.setdefault(phone, []).append(pos)
+
+    def _remove(self, pos: int, row: list):
+        r_id = _get_col(row, COL_ID).strip()
+        if self.by_id.get(r_id) == pos:
+            del self.by_id[r_id]
+        tg_id = _get_col(row, COL_TG_ID).strip()
+        if pos in self.by_tg_id.get(tg_id, []):
+            self.by_tg_id[tg_id].remove(pos)
+        phone = normalize_phone(_get_col(row, COL_PHONE))
+        if pos in self.by_phone.get(phone, []):
+            self.by_phone[phone].remove(pos)
+
+    def append(self, row: list) -> int:
+        """Add a row written at the end of the sheet. Returns its sheet row number."""
+        if self._changes is not None:
+            self._changes.append((_get_col(row, COL_ID).strip(), dict(enumerate(row)), list(row)))
+        pos = len(self.rows)
+        self.rows.append(list(row))
+        self._add(pos, self.rows[pos])
+        return pos + 2
+
+    def update_cells(self, req_id: str, values: dict):
+        """Apply {column: value} changes to a request's row."""
+        if self._changes is not None:
+            self._changes.append((str(req_id), dict(values), None))
+        pos = self.by_id.get(str(req_id))
+        if pos is None:
+            return
+        row = self.rows[pos]
+        self._remove(pos, row)
+        for col, value in values.items():
+            if col >= len(row):
+                row.extend([""] * (col + 1 - len(row)))
+            row[col] = value
+        self._add(pos, row)
+
+    def get(self, req_id: str):
+        """Returns (row_idx, row) for a request ID, or None."""
+        pos = self.by_id.get(str(req_id).strip())
+        if pos is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pos + 2, self.rows[pos]
+
+    def find_by_user(self, identifier: str) -> list:
+        """
+        Rows whose Telegram ID, normalized phone or request ID equals the identifier.
+        Returns [(row_idx, row)] in sheet order.
+        """
+        ident = str(identifier).replace(" ", "").replace("+", "").strip()
+        if not ident:
+            return []
+
+        positions = set(self.by_tg_id.get(ident, []))
+        phone = normalize_phone(ident)
+        if phone:
+            positions.update(self.by_phone.get(phone, []))
+        if ident in self.by_id:
+            positions.add(self.by_id[ident])
+
+        if positions:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return [(pos + 2, self.rows[pos]) for pos in sorted(positions)]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "rows": len(self.rows),
+            "requests": len(self.by_id),
+            "tg_ids": len(self.by_tg_id),
+            "phones": len(self.by_phone),
+            "loads": self.loads,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+request_index = RequestIndex()
@@ -0,0 +1,144 @@
+import collections
+import functools
+import hashlib
+import zlib
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import texts
+from utils import metrics
+
+# Callback data: req_page:<n|p>:<cursor request ID>:<search query, empty for own requests>
+PAGE_CALLBACK = "req_page"
+# Telegram allows 64 bytes of callback data
+MAX_CALLBACK_BYTES = 64
+
+ROW_CACHE_SIZE = 10000
+PAGE_KEYBOARD_CACHE_SIZE = 1024
+# Messages whose last rendered content we remember
+SENT_HASHES_SIZE = 10000
+
+# {(request ID, fingerprint): formatted line}, most recently used last
+_row_cache = collections.OrderedDict()
+# {(chat ID, message ID): content hash}
+_sent_hashes = collections.OrderedDict()
+render_stats = {"row_hits": 0, "row_misses": 0, "edits": 0, "edits_skipped": 0}
+metrics.register("renderer", lambda: {
+    **render_stats,
+    "cached_rows": len(_row_cache),
+    "page_keyboards": _page_keyboard.cache_info()._asdict(),
+})
+
+
+def format_date(date_raw: str) -> str:
+    """YYYY-MM-DD HH:MM:SS -> DD.MM.YYYY"""
+    if ' ' in date_raw:
+        date_part = date_raw.split(' ')[0]
+        if '-' in date_part:
+            date_parts = date_part.split('-')
+            return f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
+        return date_part
+    return date_raw
+
+
+def format_amount(amount: str) -> str:
+    """Spaces as thousand separators: 150000 -> 150 000"""
+    try:
+        return f"{int(amount.replace(' ', '')):,}".replace(',', ' ')
+    except ValueError:
+        return amount
+
+
+def format_request_row(req: dict) -> str:
+    """
+    «Заявка #123 | тип: Партнёр | статус: Смета готова | дата: 17.12.2025 | сумма: 150 000 (если есть)»
+    Cached per (request ID, fingerprint of the shown fields).
+    """
+    fields = (req['type'], req['status'], req['date'], req['amount'] or "")
+    key = (req['id'], zlib.crc32("\x1f".join(fields).encode("utf-8")))
+    line = _row_cache.get(key)
+    if line is not None:
+        render_stats["row_hits"] += 1
+        _row_cache.move_to_end(key)
+        return line
+
+    render_stats["row_misses"] += 1
+    req_type, status, date_raw, amount = fields
+    amount_text = f" | сумма: {format_amount(amount)}" if amount else ""
+    line = f"Заявка #{req['id']} | тип: {req_type} | статус: {status} | дата: {format_date(date_raw)}{amount_text}"
+    _row_cache[key] = line
+    if len(_row_cache) > ROW_CACHE_SIZE:
+        _row_cache.popitem(last=False)
+    return line
+
+
+def _page_callback(direction: str, cursor: str, query: str):
+    data = f"{PAGE_CALLBACK}:{direction}:{cursor}:{query}"
+    return data if len(data.encode("utf-8")) <= MAX_CALLBACK_BYTES else None
+
+
+@functools.lru_cache(maxsize=PAGE_KEYBOARD_CACHE_SIZE)
+def _page_keyboard(request_ids: tuple, prev_data: str, next_data: str) -> InlineKeyboardMarkup:
+    """Details buttons, navigation and refresh. Cached and shared: never mutate the result."""
+    rows = [
+        [InlineKeyboardButton(text="[Детали]", callback_data=f"req_details_{req_id}")]
+        for req_id in request_ids
+    ]
+
+    # Newest first: "back" shows newer requests, "next" older ones
+    nav = []
+    if prev_data:
+        nav.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=prev_data))
+    if next_data:
+        nav.append(InlineKeyboardButton(text="Далее ➡️", callback_data=next_data))
+    if nav:
+        rows.append(nav)
+
+    rows.append([InlineKeyboardButton(text="🔄 Обновить", callback_data="refresh_requests")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def render_requests_page(page: dict, query: str = "", title: str = "📂 <b>Ваши заявки:</b>",
+                         stale: bool = False):
+    """
+    Text, inline keyboard and content hash for one page of requests
+    (see google_sheets.get_requests_page).
+    """
+    lines = [title, ""]
+    if page["prev"] or page["next"]:
+        lines += [f"Всего заявок: {page['total']}", ""]
+
+    lines += [format_request_row(req) for req in page["requests"]]
+    kb = _page_keyboard(
+        tuple(req["id"] for req in page["requests"]),
+        page["prev"] and _page_callback("p", page["prev"], query),
+        page["next"] and _page_callback("n", page["next"], query),
+    )
+
+    text = "\n".join(lines) + "\n"
+    if stale:
+        text += texts.STALE_DATA_NOTE
+
+    digest = hashlib.sha1(text.encode("utf-8"))
+    for row in kb.inline_keyboard:
+        for button in row:
+            digest.update(f"\x1e{button.text}\x1f{button.callback_data}".encode("utf-8"))
+    return text, kb, digest.hexdigest()
+
+
+def remember_rendered(chat_id: int, message_id: int, content_hash: str):
+    """Record what a message currently shows."""
+    key = (chat_id, message_id)
+    _sent_hashes[key] = content_hash
+    _sent_hashes.move_to_end(key)
+    if len(_sent_hashes) > SENT_HASHES_SIZE:
+        _sent_hashes.popitem(last=False)
+
+
+def needs_edit(chat_id: int, message_id: int, content_hash: str) -> bool:
+    """False when the message already shows exactly this content."""
+    if _sent_hashes.get((chat_id, message_id)) == content_hash:
+        render_stats["edits_skipped"] += 1
+        return False
+    render_stats["edits"] += 1
+    return True
@@ -0,0 +1,170 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+from config import config
+
+# Scope required for accessing Google Sheets and Drive
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive",
+]
+
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+# Delay before retrying after a failed connect/refresh in the background loop
+RETRY_DELAY = 30
+
+
+class SheetClientManager:
+    """
+    Process-wide owner of the gspread client.
+    Authorizes once, keeps the worksheet handle and its HTTP session alive,
+    and refreshes the access token ahead of expiry in the background.
+    """
+
+    def __init__(self, on_connect=None):
+        # Called once with the worksheet after every (re)connect, e.g. header check
+        self.on_connect = on_connect
+        self._lock = threading.Lock()
+        self._creds = None
+        self._client = None
+        self._sheet = None
+        self._token_issued_at = None
+        self.connect_count = 0
+
+    @property
+    def reconnect_count(self) -> int:
+        return max(0, self.connect_count - 1)
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def sheet(self):
+        """The worksheet if already connected, without connecting."""
+        return self._sheet
+
+    def _load_credentials(self):
+        # Проверяем переменную окружения
+        service_account_json = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
+
+        if service_account_json:
+            # Парсинг JSON из переменной окружения
+            service_account_info = json.loads(service_account_json)
+            return Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+        if config.google_sheets.service_account_file and os.path.exists(config.google_sheets.service_account_file):
+            # Используем файл учетных данных
+            return Credentials.from_service_account_file(
+                config.google_sheets.service_account_file, scopes=SCOPES
+            )
+        return None
+
+    def get_sheet(self):
+        """Return the cached worksheet, connecting on first use. None if not configured."""
+        sheet = self._sheet
+        if sheet is not None:
+            return sheet
+
+        with self._lock:
+            if self._sheet is None:
+                self._connect()
+            return self._sheet
+
+    def _connect(self):
+        if not config.google_sheets.spreadsheet_id:
+            logging.error("Google Sheets not configured.")
+            return
+
+        try:
+            creds = self._load_credentials()
+            if creds is None:
+                # Если учетные данные не настроены, работаем без Google Sheets
+                logging.warning("Google Sheets credentials not configured. Skipping Google Sheets integration.")
+                return
+
+            client = gspread.authorize(creds)
+            # Keep HTTP calls bounded so executor threads are not held forever
+            client.set_timeout(config.google_sheets.call_timeout)
+            sheet = client.open_by_key(config.google_sheets.spreadsheet_id).sheet1
+
+            if self.on_connect:
+                self.on_connect(sheet)
+
+            self._creds = creds
+            self._client = client
+            self._sheet = sheet
+            # open_by_key has just fetched a token through the authorized session
+            self._token_issued_at = time.monotonic()
+            self.connect_count += 1
+            logging.info(f"Connected to Google Sheets (connect #{self.connect_count})")
+        except Exception as e:
+            logging.error(f"Error connecting to Google Sheets: {e}")
+
+    def reset(self):
+        """Drop the current client so the next call reconnects."""
+        with self._lock:
+            self._creds = None
+            self._client = None
+            self._sheet = None
+            self._token_issued_at = None
+
+    def _seconds_until_refresh(self) -> float:
+        creds = self._creds
+        if creds is None or creds.expiry is None:
+            return RETRY_DELAY
+        # google-auth keeps expiry as naive UTC
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return max(0.0, (creds.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN)
+
+    def refresh_token(self):
+        """Fetch a new access token through the shared HTTP session."""
+        creds = self._creds
+        if creds is None:
+            return
+        creds.refresh(Request(self._client.http_client.session))
+        self._token_issued_at = time.monotonic()
+        logging.info("Google Sheets access token refreshed")
+
+    async def run_refresher(self):
+        """
+        Background task: connects (checking headers once) at startup,
+        then keeps the access token fresh so user requests never pay for it.
+        """
+        while True:
+            try:
+                if self._sheet is None:
+                    await asyncio.to_thread(self.get_sheet)
+                    if self._sheet is None:
+                        await asyncio.sleep(RETRY_DELAY)
+                        continue
+
+                await asyncio.sleep(self._seconds_until_refresh())
+                await asyncio.to_thread(self.refresh_token)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error refreshing Google Sheets token: {e}")
+                self.reset()
+                await asyncio.sleep(RETRY_DELAY)
+
+    def stats(self) -> dict:
+        token_age = None
+        if self._token_issued_at is not None:
+            token_age = round(time.monotonic() - self._token_issued_at, 1)
+        return {
+            "connected": self._sheet is not None,
+            "reconnects": self.reconnect_count,
+            "token_age_sec": token_age,
+        }
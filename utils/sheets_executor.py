@@ -0,0 +1,143 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import config
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.quota_governor import QuotaGovernor
+
+
+class SheetsExecutor:
+    """
+    Runs blocking gspread calls in a dedicated, size-limited thread pool
+    so the aiogram event loop never waits on Google Sheets I/O.
+    Every call first takes its share of the API quota from the governor;
+    while the circuit breaker is open calls fail at once instead.
+    """
+
+    def __init__(self, max_workers: int, timeout: float, governor: QuotaGovernor = None,
+                 breaker: CircuitBreaker = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.governor = governor
+        self.breaker = breaker
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+        self._lock = threading.Lock()
+        # Calls submitted but not finished (waiting for a worker + running)
+        self.depth = 0
+        self.max_depth = 0
+        self.running = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def _call(self, func, enqueued_at, args, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self.running += 1
+            self._total_wait += started - enqueued_at
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self._total_run += time.monotonic() - started
+
+    async def run(self, func, *args, timeout: float = None, probe: bool = False, **kwargs):
+        """
+        Run func(*args, **kwargs) in the pool and await the result with a timeout.
+        probe=True lets the breaker's recovery probe through while it is open.
+        """
+        if self.breaker is not None and not probe and not self.breaker.allow():
+            raise CircuitOpenError("Google Sheets is temporarily unavailable")
+        if self.governor is not None:
+            await self.governor.acquire()
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        started = time.monotonic()
+        call = functools.partial(self._call, func, started, args, kwargs)
+        error = None
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, call),
+                timeout or self.timeout,
+            )
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            error = e
+            logging.warning(f"Sheets call {getattr(func, '__name__', func)} timed out")
+            raise
+        except Exception as e:
+            self.errors += 1
+            error = e
+            raise
+        finally:
+            self.depth -= 1
+            if self.breaker is not None:
+                self.breaker.record(time.monotonic() - started, error)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        finished = max(1, self.calls - self.depth)
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "running": self.running,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self._total_wait / finished * 1000, 1),
+            "avg_run_ms": round(self._total_run / finished * 1000, 1),
+        }
+
+
+class AsyncWorksheet:
+    """
+    Async facade over a gspread Worksheet: every method call is executed
+    in the Sheets executor and returns an awaitable.
+    Usage: values = await sheet.get_all_values()
+    """
+
+    def __init__(self, worksheet, executor: SheetsExecutor):
+        self.worksheet = worksheet
+        self._executor = executor
+
+    def __getattr__(self, name):
+        attr = getattr(self.worksheet, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self._executor.run(attr, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+
+quota_governor = QuotaGovernor(
+    per_minute=config.google_sheets.quota_per_minute,
+    reserve=config.google_sheets.quota_reserve,
+)
+
+sheets_breaker = CircuitBreaker(
+    failure_threshold=config.google_sheets.breaker_failures,
+    slow_call=config.google_sheets.breaker_slow_call,
+    cooldown=config.google_sheets.breaker_cooldown,
+)
+
+sheets_executor = SheetsExecutor(
+    max_workers=config.google_sheets.workers,
+    timeout=config.google_sheets.call_timeout,
+    governor=quota_governor,
+    breaker=sheets_breaker,
+)
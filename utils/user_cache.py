@@ -0,0 +1,141 @@
+import asyncio
+import collections
+import logging
+import time
+
+from utils.request_index import normalize_phone
+
+
+def _query(identifier) -> str:
+    # Same normalization as RequestIndex.find_by_user
+    return str(identifier).replace(" ", "").replace("+", "").strip()
+
+
+def query_tags(identifier) -> set:
+    """Index keys a lookup by this identifier reads: Telegram ID, phone, request ID."""
+    ident = _query(identifier)
+    tags = {("tg", ident), ("id", ident)}
+    phone = normalize_phone(ident)
+    if phone:
+        tags.add(("phone", phone))
+    return tags
+
+
+def row_tags(tg_id: str, phone: str, req_id: str) -> set:
+    """Index keys under which a row is found."""
+    tags = {("tg", str(tg_id).strip()), ("id", str(req_id).strip())}
+    phone = normalize_phone(phone)
+    if phone:
+        tags.add(("phone", phone))
+    return tags
+
+
+class UserRequestsCache:
+    """
+    Per-user request lists with stale-while-revalidate: fresh entries
+    (younger than ttl) are returned as is, stale ones are returned at once
+    and refreshed in the background. Empty results are cached too.
+    Entries are dropped when a row they could match changes, and the least
+    recently used ones are evicted beyond max_size.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        # {query: (results, fetched_at)}, most recently used last
+        self._entries = collections.OrderedDict()
+        # {tag: {query}}
+        self._by_tag = {}
+        self._refreshing = {}
+        # Bumped on every invalidation, so loads that raced one aren't cached
+        self._epoch = 0
+        # async prepare(), awaited before each load; invalidations it causes
+        # (e.g. reloading the data the loader reads) don't discard the load
+        self.prepare = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, identifier, loader, stale: bool = False):
+        """
+        Cached results for identifier; loader(identifier) is an async fetch.
+        stale=True serves an existing entry as stale whatever its age
+        (e.g. while the data behind it is being reloaded).
+        """
+        key = _query(identifier)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return await self._load(key, identifier, loader)
+
+        self._entries.move_to_end(key)
+        results, fetched_at = entry
+        if not stale and time.monotonic() - fetched_at < self.ttl:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                self._refreshing[key] = asyncio.create_task(self._refresh(key, identifier, loader))
+        return results
+
+    async def _load(self, key, identifier, loader):
+        if self.prepare is not None:
+            await self.prepare()
+        started, epoch = time.monotonic(), self._epoch
+        results = await loader(identifier)
+        # Rows changed while loading: don't cache what may be outdated
+        if epoch == self._epoch:
+            self._store(key, results, started)
+        return results
+
+    async def _refresh(self, key, identifier, loader):
+        try:
+            await self._load(key, identifier, loader)
+        except Exception as e:
+            logging.error(f"Error refreshing cached requests for {key}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _store(self, key, results, fetched_at):
+        if key not in self._entries:
+            for tag in query_tags(key):
+                self._by_tag.setdefault(tag, set()).add(key)
+        self._entries[key] = (results, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        for tag in query_tags(key):
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate_rows(self, rows: list):
+        """Drop entries that could list any of these (tg_id, phone, req_id) rows."""
+        self._epoch += 1
+        for row in rows:
+            for tag in row_tags(*row):
+                for key in list(self._by_tag.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        self._epoch += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_tag.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "refreshing": len(self._refreshing),
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+
+# Delay before retrying a failed restore; doubles up to the max
+RESTORE_BASE_DELAY = 1
+RESTORE_MAX_DELAY = 60
+
+
+class WriteBehindQueue:
+    """
+    Collects new sheet rows and writes them in batches: every flush_interval
+    or as soon as max_rows rows are waiting, whichever comes first.
+    Callers await their request ID, resolved once the row is written.
+    Rows still queued at shutdown are kept by the caller's local store and
+    handed back by `restore` on start, retried with backoff until it succeeds.
+    Rows are told apart by their first cell (the request ID).
+    """
+
+    def __init__(self, flush_rows, flush_interval_ms: int, max_rows: int, restore=None):
+        # async flush_rows(rows) -> list of assigned IDs; raises on failure
+        self._flush_rows = flush_rows
+        # async restore() -> rows accepted earlier but never written
+        self._restore = restore
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        # [(row, future or None)]
+        self._queue = []
+        self._wakeup = asyncio.Event()
+        # Held while rows are written; other structural sheet edits
+        # (e.g. re-sorting) take it too so they never interleave with a flush
+        self.lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = None
+
+    def submit(self, row: list) -> asyncio.Future:
+        """Queue a row. The returned future resolves to its request ID once written."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((row, future))
+        if len(self._queue) >= self.max_rows:
+            self._wakeup.set()
+        return future
+
+    async def flush(self):
+        async with self.lock:
+            if not self._queue:
+                return
+            batch = self._queue[:self.max_rows]
+            started = time.monotonic()
+            try:
+                ids = await self._flush_rows([row for row, _ in batch])
+            except Exception as e:
+                # Rows stay queued and are retried on the next flush
+                self.failed_flushes += 1
+                logging.error(f"Error flushing {len(batch)} queued rows to Google Sheets: {e}")
+                return
+
+            del self._queue[:len(batch)]
+            self.flushes += 1
+            self.rows_written += len(batch)
+            self.last_flush_ms = round((time.monotonic() - started) * 1000, 1)
+            for (_, future), req_id in zip(batch, ids):
+                if future is not None and not future.done():
+                    future.set_result(req_id)
+            logging.info(f"Flushed {len(batch)} rows to Google Sheets")
+
+    async def run(self):
+        """Background flusher task."""
+        restored = await self._load_pending()
+        delay = RESTORE_BASE_DELAY
+        retry_at = time.monotonic() + delay
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not restored and time.monotonic() >= retry_at:
+                restored = await self._load_pending()
+                delay = min(delay * 2, RESTORE_MAX_DELAY)
+                retry_at = time.monotonic() + delay
+            await self.flush()
+
+    async def stop(self):
+        """Graceful shutdown: flush what we can; the rest is restored on next start."""
+        while self._queue:
+            queued = len(self._queue)
+            await self.flush()
+            if len(self._queue) == queued:
+                break
+        if self._queue:
+            logging.warning(f"{len(self._queue)} rows not written to Google Sheets, will retry on start")
+
+    async def _load_pending(self) -> bool:
+        """Queue the rows handed back by `restore`. Returns False if it failed."""
+        if self._restore is None:
+            return True
+        try:
+            rows = await self._restore()
+        except Exception as e:
+            logging.error(f"Error restoring unwritten rows, will retry: {e}")
+            return False
+        async with self.lock:
+            # Rows submitted since start (e.g. replayed ones) are already queued
+            queued = {row[0] for row, _ in self._queue}
+            rows = [row for row in rows if row[0] not in queued]
+            if rows:
+                self._queue[:0] = [(row, None) for row in rows]
+                logging.info(f"Re-queued {len(rows)} rows not written before the last shutdown")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }